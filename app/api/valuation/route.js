@@ -0,0 +1,35 @@
+import { NextResponse } from "next/server";
+
+const API_URL = process.env.GOOGLE_CLOUD_API_URL;
+
+export async function POST(req) {
+  try {
+    const data = await req.json();
+    console.log('Received data in /valuation API route:', data);
+
+    if (!API_URL) {
+      throw new Error('GOOGLE_CLOUD_API_URL is not set in environment variables');
+    }
+
+    const response = await fetch(`${API_URL}/valuation`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(data),
+    });
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error! status: ${response.status}, message: ${errorText}`);
+    }
+
+    const result = await response.json();
+    console.log('Received result from Google Cloud Function:', result);
+
+    return NextResponse.json(result);
+  } catch (error) {
+    console.error('Error in /valuation API route:', error);
+    return NextResponse.json({ error: error.message }, { status: 500 });
+  }
+}
@@ -184,8 +184,8 @@ function ResultComponent() {
         return;
       }
 
-      // Call the serverless function to generate additional columns
-      const response = await fetch("/api/generate_columns", {
+      // Generate the additional columns and run the XGBoost prediction in one call
+      const predictionResponse = await fetch("/api/valuation", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -201,47 +201,17 @@ function ResultComponent() {
         }),
       });
 
-      if (!response.ok) {
-        const errorData = await response.json();
-        console.error("Error response from generate_columns:", errorData);
-        throw new Error(
-          `Failed to generate additional columns: ${errorData.message || JSON.stringify(errorData)}`
-        );
-      }
-
-      const generatedColumnsData = await response.json();
-      console.log("Generated columns data:", generatedColumnsData);
-      setGeneratedColumns(generatedColumnsData);
-
-      // Call the XGBoost prediction API
-      const predictionResponse = await fetch("/api/predict", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({
-          originalInputs: {
-            property_type,
-            size,
-            ber_rating,
-            latitude: lat,
-            longitude: lng,
-            beds,
-            baths,
-          },
-          ...generatedColumnsData,
-        }),
-      });
-
       if (!predictionResponse.ok) {
         const predictionErrorData = await predictionResponse.json();
-        console.error("Error response from XGBoost prediction:", predictionErrorData);
+        console.error("Error response from valuation:", predictionErrorData);
         throw new Error(
           `Failed to get XGBoost prediction: ${predictionErrorData.message || JSON.stringify(predictionErrorData)}`
         );
       }
 
       const predictionResult = await predictionResponse.json();
+      console.log("Generated columns data:", predictionResult.columns);
+      setGeneratedColumns(predictionResult.columns);
       console.log("Received prediction:", predictionResult.prediction);
 
       // Round the prediction to the nearest $10
@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta
+import numpy as np
+from categorical import BER_CATEGORIES, PROPERTY_TYPE_CATEGORIES
+
+# Time windows (days) of the time-based and price trend metrics
+WINDOWS = [30, 90, 180]
+# Window that splits recent from older sales for the market trend
+MARKET_TREND_DAYS = 30
+
+class RunningMean:
+    """
+    Sum and count of the non-NaN values seen so far.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, values):
+        values = values[~np.isnan(values)]
+        self.total += float(values.sum(dtype=np.float64))
+        self.count += len(values)
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+class QuantileSketch:
+    """
+    Mergeable quantile summary with bounded memory.
+
+    Values are kept as (distinct value, count, sum) until more than max_distinct distinct
+    values have been seen. After that every value is rounded to the midpoint of its
+    logarithmic bucket (relative error at most relative_accuracy, as in DDSketch), so
+    memory is bounded by the range of the values rather than by how many there are.
+    While exact, median() matches np.median; sums and counts are always exact.
+    """
+
+    def __init__(self, max_distinct=2048, relative_accuracy=0.005):
+        self.max_distinct = max_distinct
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.exact = True
+        self.values = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.sums = np.empty(0)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    @property
+    def total(self):
+        return float(self.sums.sum())
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    def _bucket(self, values):
+        # Midpoint of the bucket (gamma^(k-1), gamma^k] holding each |value|; 0 stays 0
+        magnitude = np.abs(values)
+        with np.errstate(divide='ignore'):
+            k = np.ceil(np.log(magnitude) / np.log(self.gamma))
+        midpoint = 2 * self.gamma ** k / (self.gamma + 1)
+        return np.where(magnitude == 0, 0.0, np.sign(values) * midpoint)
+
+    def _insert(self, keys, counts, sums):
+        keys = np.concatenate([self.values, keys])
+        distinct, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]), minlength=len(distinct)).astype(np.int64)
+        self.sums = np.bincount(inverse, weights=np.concatenate([self.sums, sums]), minlength=len(distinct))
+        self.values = distinct
+        if self.exact and len(self.values) > self.max_distinct:
+            self.exact = False
+            values, counts, sums = self.values, self.counts, self.sums
+            self.values, self.counts, self.sums = np.empty(0), np.empty(0, dtype=np.int64), np.empty(0)
+            self._insert(self._bucket(values), counts, sums)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        keys = values if self.exact else self._bucket(values)
+        self._insert(keys, np.ones(len(values), dtype=np.int64), values)
+
+    def merge(self, other):
+        if not other.exact and self.exact:
+            self.exact = False
+            self.values = self._bucket(self.values)
+        keys = other.values if self.exact else self._bucket(other.values)
+        self._insert(keys, other.counts, other.sums)
+
+    def _value_at(self, rank, cumulative):
+        return self.values[int(np.searchsorted(cumulative, rank, side='right'))]
+
+    def median(self):
+        """
+        Median of the values; NaN if there are none (like nan_median).
+        """
+        n = self.count
+        if not n:
+            return np.nan
+        cumulative = np.cumsum(self.counts)
+        low, high = self._value_at((n - 1) // 2, cumulative), self._value_at(n // 2, cumulative)
+        return low if n % 2 else (low + high) / 2
+
+    def mean_where(self, lower=None, upper=None):
+        """
+        Mean of the values within [lower, upper]; NaN if there are none.
+        """
+        mask = np.ones(len(self.values), dtype=bool)
+        if lower is not None:
+            mask &= self.values >= lower
+        if upper is not None:
+            mask &= self.values <= upper
+        count = self.counts[mask].sum()
+        return float(self.sums[mask].sum()) / count if count else np.nan
+
+class ComparablesAggregate:
+    """
+    Running summaries of the comparables within one radius, updated one chunk at a time.
+
+    Holds what the per-radius metrics, market trend, price benchmarks and price trends
+    need (counts, running means and quantile sketches) so the rows themselves can be
+    released after each chunk. Aggregates merge, e.g. to combine the radii.
+    """
+
+    def __init__(self, now=None):
+        now = now or datetime.now()
+        self.cutoffs = {days: np.datetime64(now - timedelta(days=days)) for days in WINDOWS}
+
+        # All comparables, sold or not
+        self.rows = 0
+        # Sold comparables
+        self.sale_price = QuantileSketch()
+        self.first_list_price = RunningMean()
+        self.floor_area = RunningMean()
+        self.beds = QuantileSketch()
+        self.baths = QuantileSketch()
+        self.ber_counts = np.zeros(len(BER_CATEGORIES), dtype=np.int64)
+        self.property_type_counts = np.zeros(len(PROPERTY_TYPE_CATEGORIES), dtype=np.int64)
+        self.older_sale_price = RunningMean()
+        self.windows = {
+            days: {
+                'sale_price': QuantileSketch(),
+                'asking_price': RunningMean(),
+                'days_on_market': RunningMean(),
+                'price_per_sqm': QuantileSketch(),
+            }
+            for days in WINDOWS
+        }
+
+    @property
+    def sold(self):
+        return int(self.ber_counts.sum())
+
+    def update(self, comparables):
+        """
+        Add a chunk of comparables (a Comparables container) to the summaries.
+        """
+        self.rows += len(comparables)
+        sold = comparables.sold()
+        sale_price = sold['sale_price']
+        sale_date = sold['sale_date']
+
+        self.sale_price.add(sale_price)
+        self.first_list_price.add(sold['first_list_price'])
+        self.floor_area.add(sold['myhome_floor_area_value'])
+        self.beds.add(sold['beds'])
+        self.baths.add(sold['baths'])
+        self.ber_counts += np.bincount(sold['ber_category'], minlength=len(BER_CATEGORIES))
+        self.property_type_counts += np.bincount(sold['property_type_category'], minlength=len(PROPERTY_TYPE_CATEGORIES))
+        # Sales before the market trend window; the sales within it are in windows[MARKET_TREND_DAYS]
+        self.older_sale_price.add(sale_price[sale_date < self.cutoffs[MARKET_TREND_DAYS]])
+
+        days_on_market = np.floor((sale_date - sold['first_list_date']) / np.timedelta64(1, 'D'))
+        area = np.where(sold['myhome_floor_area_value'] == 0, np.nan, sold['myhome_floor_area_value'])
+        price_per_sqm = sale_price / area
+        for days, window in self.windows.items():
+            recent = sale_date >= self.cutoffs[days]
+            window['sale_price'].add(sale_price[recent])
+            window['asking_price'].add(sold['asking_price'][recent])
+            window['days_on_market'].add(days_on_market[recent])
+            window['price_per_sqm'].add(price_per_sqm[recent])
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.sale_price.merge(other.sale_price)
+        self.first_list_price.merge(other.first_list_price)
+        self.floor_area.merge(other.floor_area)
+        self.beds.merge(other.beds)
+        self.baths.merge(other.baths)
+        self.ber_counts += other.ber_counts
+        self.property_type_counts += other.property_type_counts
+        self.older_sale_price.merge(other.older_sale_price)
+        for days, window in self.windows.items():
+            for name, summary in window.items():
+                summary.merge(other.windows[days][name])
@@ -0,0 +1,123 @@
+"""
+Benchmark the columnar Comparables container against lists of dicts / DataFrames.
+
+Reports memory per 10k comparables and the time to decode and compute the
+per-radius metrics for the [1, 3, 5] km radii.
+
+Usage: python benchmarks/bench_comparables.py [num_comparables]
+"""
+import logging
+import math
+import os
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from comparables import Comparables
+from generate_columns import (
+    calculate_days_on_market, calculate_distance, calculate_nearby_metrics, get_ber_category,
+    get_property_type_category, preprocess_property_data, safe_divide,
+)
+from benchmarks.synthetic import make_properties
+
+LATITUDE, LONGITUDE = 53.29, -6.2
+RADII = [1, 3, 5]
+
+def allocated_bytes(build):
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+def legacy_nearby_properties(records, latitude, longitude, radius_km):
+    """
+    Previous fetch path: one bounding box query per radius, then a row-by-row distance filter.
+    The box uses 111.32 km per degree, slightly less than the Haversine Earth radius, so it
+    clips the edges of the circle; slicing one 5 km box keeps those rows.
+    """
+    lat_range = radius_km / 111.32
+    lon_range = radius_km / (111.32 * math.cos(math.radians(latitude)))
+    return [
+        prop for prop in records
+        if abs(prop['latitude'] - latitude) <= lat_range and abs(prop['longitude'] - longitude) <= lon_range
+        and calculate_distance(latitude, longitude, prop['latitude'], prop['longitude']) <= radius_km
+    ]
+
+def legacy_nearby_metrics(nearby_props, radius):
+    """
+    Previous calculate_nearby_metrics: a preprocessed DataFrame with row-wise derived columns.
+    """
+    metrics = {}
+    df = pd.DataFrame([dict(prop) for prop in nearby_props])
+    if df.empty:
+        return metrics
+    df = df.apply(preprocess_property_data, axis=1)
+    df = df.dropna(subset=['sale_price', 'latitude', 'longitude'])
+    df['days_on_market'] = df.apply(
+        lambda row: calculate_days_on_market(row.get('first_list_date'), row.get('sale_date')), axis=1
+    )
+    df['price_per_square_meter'] = df.apply(
+        lambda row: safe_divide(row.get('sale_price'), row.get('myhome_floor_area_value')), axis=1
+    )
+    for days in [30, 90, 180]:
+        recent_df = df[df['sale_date'] >= pd.Timestamp.now() - pd.Timedelta(days=days)]
+        metrics.update({
+            f'{days}d_{radius}km_median_sold_price': recent_df['sale_price'].median(),
+            f'{days}d_{radius}km_avg_asking_price': recent_df['asking_price'].mean(),
+            f'{days}d_{radius}km_num_properties_sold': recent_df['sale_price'].notna().sum(),
+            f'{days}d_{radius}km_avg_days_on_market': pd.to_numeric(recent_df['days_on_market']).mean(),
+            f'{days}d_{radius}km_median_price_per_sqm': pd.to_numeric(recent_df['price_per_square_meter']).median(),
+        })
+    for ber, percent in (df['ber_rating'].apply(get_ber_category).value_counts(normalize=True) * 100).items():
+        metrics[f'{radius}km_ber_dist_{ber}'] = round(percent, 2)
+    for prop_type, percent in (df['property_type'].apply(get_property_type_category).value_counts(normalize=True) * 100).items():
+        metrics[f'{radius}km_property_type_dist_{prop_type}'] = round(percent, 2)
+    metrics.update({
+        f'{radius}km_avg_property_size': round(df['myhome_floor_area_value'].mean(), 2),
+        f'{radius}km_median_beds': df['beds'].median(),
+        f'{radius}km_median_baths': df['baths'].median(),
+        f'{radius}km_price_to_income_ratio': round(safe_divide(df['sale_price'].median(), 50000), 2),
+        f'{radius}km_price_growth_rate': round(
+            safe_divide((df['sale_price'].mean() / df['first_list_price'].mean()) - 1, 1) * 100, 2
+        ) if df['first_list_price'].mean() else None,
+    })
+    return metrics
+
+def legacy_metrics(records):
+    """
+    Previous decode and metrics path: a filtered list of dicts per radius, turned into a
+    DataFrame and preprocessed row by row.
+    """
+    for radius in RADII:
+        legacy_nearby_metrics(legacy_nearby_properties(records, LATITUDE, LONGITUDE, radius), radius)
+
+def columnar_metrics(records):
+    comparables = Comparables.from_records(records, LATITUDE, LONGITUDE, radius_km=max(RADII))
+    for radius in RADII:
+        calculate_nearby_metrics(comparables.within(radius), radius)
+
+def main():
+    logging.disable(logging.CRITICAL)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    scale = 10000 / n
+
+    records, records_bytes = allocated_bytes(lambda: make_properties(n, LATITUDE, LONGITUDE))
+    frame = pd.DataFrame(records)
+    comparables = Comparables.from_records(records, LATITUDE, LONGITUDE)
+
+    print(f"Comparables: {n}")
+    print(f"{'list of dicts':<24} {records_bytes * scale / 1e6:8.2f} MB per 10k")
+    print(f"{'DataFrame (deep)':<24} {frame.memory_usage(deep=True).sum() * scale / 1e6:8.2f} MB per 10k")
+    print(f"{'Comparables':<24} {comparables.nbytes * scale / 1e6:8.2f} MB per 10k")
+
+    for name, run in [('legacy decode + metrics', legacy_metrics), ('columnar decode + metrics', columnar_metrics)]:
+        start = time.perf_counter()
+        run(records)
+        print(f"{name:<24} {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
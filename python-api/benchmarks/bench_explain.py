@@ -0,0 +1,49 @@
+"""
+Benchmark the latency added by explain=true (XGBoost pred_contribs) to predictions.
+
+Reports per-row latency for single predictions and the total for a 1k-row batch,
+with and without explanations. Feature preparation is excluded; both paths share
+the same transformed matrix.
+
+Usage: python benchmarks/bench_explain.py [batch_size]
+"""
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from predict import build_feature_frame, get_model, predict_frame
+from benchmarks.synthetic import make_prediction_rows
+
+def best_of(run, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    logging.disable(logging.CRITICAL)
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    model = get_model()
+
+    single = build_feature_frame(make_prediction_rows(1), model)
+    batch = build_feature_frame(make_prediction_rows(batch_size), model)
+
+    plain = best_of(lambda: predict_frame(model, single), repeat=50)
+    for explain in [True, 'approx']:
+        explained = best_of(lambda: predict_frame(model, single, explain=explain), repeat=20)
+        print(f"single row, explain={explain!s:<8} {plain * 1e3:8.2f} ms -> {explained * 1e3:8.2f} ms "
+              f"(+{(explained - plain) * 1e3:.2f} ms/row)")
+
+    plain = best_of(lambda: predict_frame(model, batch), repeat=3)
+    for explain in [True, 'approx']:
+        explained = best_of(lambda: predict_frame(model, batch, explain=explain), repeat=1)
+        print(f"{batch_size} rows, explain={explain!s:<8} {plain * 1e3:8.2f} ms -> {explained * 1e3:8.2f} ms "
+              f"(+{(explained - plain) * 1e3:.2f} ms/batch, +{(explained - plain) / batch_size * 1e3:.3f} ms/row)")
+
+if __name__ == "__main__":
+    main()
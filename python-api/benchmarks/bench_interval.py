@@ -0,0 +1,87 @@
+"""
+Benchmark the cost of serving quantile interval models alongside the main model.
+
+Interval models are fitted here on synthetic rows (the repo does not ship trained
+ones), with the same tree count and depth as the main regressor so traversal cost
+is representative. Compares:
+  - main model only
+  - main + lower/upper models on one shared transformed matrix (predict_frame)
+  - main + lower/upper models each preparing and transforming features again
+
+and checks the shared-matrix overhead against a fixed per-request budget.
+
+Usage: python benchmarks/bench_interval.py [batch_size] [budget_ms]
+"""
+import logging
+import os
+import sys
+import time
+import numpy as np
+import xgboost as xgb
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from predict import build_feature_frame, get_model, predict_frame, split_model
+from benchmarks.synthetic import make_prediction_rows
+
+def fit_interval_models(model, rows, n_estimators=None, max_depth=None, alphas=(0.1, 0.9)):
+    """
+    Fit lower/upper quantile regressors on the main model's transformed features,
+    using its predictions with multiplicative noise as the target.
+    """
+    preprocessor, regressor = split_model(model)
+    matrix = preprocessor.transform(build_feature_frame(rows, model))
+    rng = np.random.default_rng(0)
+    target = regressor.predict(matrix) * rng.lognormal(0, 0.15, len(rows))
+
+    params = regressor.get_params()
+    interval_models = {}
+    for name, alpha in zip(['lower', 'upper'], alphas):
+        interval_model = xgb.XGBRegressor(
+            objective='reg:quantileerror', quantile_alpha=alpha,
+            n_estimators=n_estimators or params['n_estimators'], max_depth=max_depth or params['max_depth'],
+            learning_rate=params['learning_rate'], n_jobs=params['n_jobs'],
+        )
+        interval_models[name] = interval_model.fit(matrix, target)
+    return interval_models
+
+def best_of(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    logging.disable(logging.CRITICAL)
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    model = get_model()
+    interval_models = fit_interval_models(model, make_prediction_rows(2000, seed=1))
+
+    for label, rows, repeat in [('single row', make_prediction_rows(1), 30), (f'{batch_size} rows', make_prediction_rows(batch_size), 3)]:
+        def separate_preparation():
+            predict_frame(model, build_feature_frame(rows, model))
+            for interval_model in interval_models.values():
+                preprocessor, _ = split_model(model)
+                split_model(interval_model)[1].predict(preprocessor.transform(build_feature_frame(rows, model)))
+
+        main_only = best_of(lambda: predict_frame(model, build_feature_frame(rows, model)), repeat)
+        shared = best_of(lambda: predict_frame(model, build_feature_frame(rows, model), interval_models=interval_models), repeat)
+        separate = best_of(separate_preparation, repeat)
+        print(f"{label:<12} main {main_only * 1e3:8.2f} ms | +interval shared matrix {shared * 1e3:8.2f} ms "
+              f"(+{(shared - main_only) * 1e3:.2f} ms) | re-prepared per model {separate * 1e3:8.2f} ms")
+
+        if label == 'single row':
+            overhead_ms = (shared - main_only) * 1e3
+            within_budget = overhead_ms <= budget_ms
+            print(f"interval overhead {overhead_ms:.2f} ms per request: {'within' if within_budget else 'OVER'} "
+                  f"the {budget_ms:.1f} ms budget")
+
+    if not within_budget:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark the /generate_columns response encoding.
+
+Compares the previous path (replace_nan + json.dumps/json.loads + jsonify) with
+serialization.dumps on a generate_columns-shaped payload of 100+ keys.
+
+Usage: python benchmarks/bench_serialization.py [iterations]
+"""
+import json
+import math
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import serialization
+
+def make_payload(seed=0):
+    """
+    Build a payload with the same keys and value types generate_columns returns.
+    """
+    rng = np.random.default_rng(seed)
+    payload = {
+        'bedCategory': '3 Bed',
+        'bathCategory': '2',
+        'propertyTypeCategory': 'House',
+        'berCategory': 'B',
+        'sizeCategory': 'Large',
+        'latitude': np.float64(53.2906),
+        'longitude': np.float64(-6.2057),
+        'energy_rating_numeric': 16.0,
+    }
+    for radius in [1, 3, 5]:
+        payload[f'nearby_properties_count_within_{radius}km'] = int(rng.integers(10, 2000))
+        for days in [30, 90, 180]:
+            payload[f'{days}d_{radius}km_median_sold_price'] = np.float64(rng.normal(450000, 50000))
+            payload[f'{days}d_{radius}km_avg_asking_price'] = np.float64(rng.normal(430000, 50000))
+            payload[f'{days}d_{radius}km_num_properties_sold'] = np.int64(rng.integers(0, 200))
+            payload[f'{days}d_{radius}km_avg_days_on_market'] = np.float64('nan') if days == 30 else np.float64(rng.normal(60, 10))
+            payload[f'{days}d_{radius}km_median_price_per_sqm'] = np.float64(rng.normal(4500, 300))
+        for ber in ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'Unknown']:
+            payload[f'{radius}km_ber_dist_{ber}'] = round(float(rng.uniform(0, 30)), 2)
+        for prop_type in ['Apartment', 'House', 'Other']:
+            payload[f'{radius}km_property_type_dist_{prop_type}'] = round(float(rng.uniform(0, 60)), 2)
+        payload[f'{radius}km_avg_property_size'] = np.float64(rng.normal(110, 10))
+        payload[f'{radius}km_median_beds'] = np.float64(3.0)
+        payload[f'{radius}km_median_baths'] = np.float64(2.0)
+        payload[f'{radius}km_price_to_income_ratio'] = np.float64(9.1)
+        payload[f'{radius}km_price_growth_rate'] = np.float64(rng.normal(3, 1))
+    payload['market_trend_30_days'] = float('nan')
+    payload['price_benchmark_ratio_low_high'] = np.float64(0.61)
+    payload['price_benchmark_ratio_high_overall'] = np.float64(1.42)
+    for days in [30, 90, 180]:
+        payload[f'price_trend_{days}_days'] = np.float64(rng.normal(450000, 50000))
+    return payload
+
+def replace_nan(obj):
+    if isinstance(obj, float) and math.isnan(obj):
+        return None
+    elif isinstance(obj, dict):
+        return {k: replace_nan(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [replace_nan(element) for element in obj]
+    else:
+        return obj
+
+def legacy_encode(payload):
+    """
+    The encoding previously done across generate_columns() and generate_columns_api().
+    """
+    result = replace_nan(payload)
+    json_safe_result = json.loads(json.dumps(result, default=str))
+    return json.dumps(json_safe_result, sort_keys=True).encode('utf-8')
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    payload = make_payload()
+    print(f"Payload keys: {len(payload)}")
+
+    orjson_module = serialization.orjson
+    backends = [('serialization.dumps (stdlib)', None)]
+    if orjson_module is not None:
+        backends.append(('serialization.dumps (orjson)', orjson_module))
+
+    seconds = min(timeit.repeat(lambda: legacy_encode(payload), number=iterations, repeat=3))
+    print(f"{'legacy dumps/loads/jsonify':<32} {seconds / iterations * 1e6:8.1f} us/payload")
+    for name, backend in backends:
+        serialization.orjson = backend
+        seconds = min(timeit.repeat(lambda: serialization.dumps(payload), number=iterations, repeat=3))
+        print(f"{name:<32} {seconds / iterations * 1e6:8.1f} us/payload")
+    serialization.orjson = orjson_module
+
+if __name__ == "__main__":
+    main()
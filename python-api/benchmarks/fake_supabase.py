@@ -0,0 +1,167 @@
+"""
+Local PostgREST-compatible stand-in for the Supabase project, seeded with synthetic
+scraped_property_data_v2 rows, so main.py can be load-tested without the real database.
+
+It implements the subset of PostgREST the service uses:
+GET /rest/v1/<table>?select=<* or column list>&<column>=<op>.<value> with eq, gt, gte,
+lt and lte filters on numeric columns, plus optional order (numeric and date columns,
+with PostgreSQL's default NULL placement) and limit. Like PostgREST's max-rows setting,
+max_rows caps the rows of every response whatever the limit.
+
+Usage:
+    python benchmarks/fake_supabase.py --rows 200000 --port 54321
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_ANON_KEY=local.anon.key python main.py
+"""
+import argparse
+import json
+import logging
+import operator
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.synthetic import make_properties
+
+TABLE = 'scraped_property_data_v2'
+# Any value shaped like a JWT passes the supabase client's key check
+ANON_KEY = 'local.anon.key'
+
+OPERATORS = {'eq': operator.eq, 'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le}
+
+class PropertyTable:
+    """
+    Rows held as pre-encoded JSON with numeric columns as arrays for fast filtering.
+    """
+
+    def __init__(self, rows, max_rows=None):
+        self.rows = rows
+        self.max_rows = max_rows
+        self.encoded = np.array([json.dumps(row).encode('utf-8') for row in rows], dtype=object)
+        self.numeric = {}
+        for column in ['id', 'latitude', 'longitude', 'sale_price', 'asking_price', 'myhome_floor_area_value']:
+            values = [row.get(column) for row in rows]
+            self.numeric[column] = np.array([np.nan if value is None else float(value) for value in values])
+        # Sort keys: the numeric columns plus dates as nanoseconds since the epoch
+        self.sortable = dict(self.numeric)
+        for column in ['sale_date', 'first_list_date']:
+            dates = pd.to_datetime(pd.Series([row.get(column) for row in rows], dtype=object), errors='coerce')
+            self.sortable[column] = dates.astype('int64').where(dates.notna()).to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def select(self, filters, order=None, limit=None, columns='*'):
+        mask = np.ones(len(self.encoded), dtype=bool)
+        for column, op, value in filters:
+            if column not in self.numeric:
+                raise ValueError(f"Unsupported filter column: {column}")
+            mask &= OPERATORS[op](self.numeric[column], float(value))
+        index = np.flatnonzero(mask)
+        if order is not None:
+            index = index[self.order(index, order)]
+        if limit is not None:
+            index = index[:limit]
+        if self.max_rows is not None:
+            index = index[:self.max_rows]
+        if columns != '*':
+            names = columns.split(',')
+            return json.dumps([{name: self.rows[i].get(name) for name in names} for i in index]).encode('utf-8')
+        return b'[' + b','.join(self.encoded[index]) + b']'
+
+    def order(self, index, order):
+        """
+        Positions that sort index by a PostgREST order spec such as 'sale_date.desc.nullslast'.
+        """
+        column, *modifiers = order.split('.')
+        if column not in self.sortable:
+            raise ValueError(f"Unsupported order column: {column}")
+        keys = self.sortable[column][index]
+        descending = 'desc' in modifiers
+        # PostgreSQL puts NULLs first for DESC and last for ASC unless told otherwise
+        nulls_first = 'nullsfirst' in modifiers or (descending and 'nullslast' not in modifiers)
+        positions = np.argsort(-keys if descending else keys, kind='stable')
+        nulls = np.isnan(keys[positions])
+        return np.concatenate([positions[nulls], positions[~nulls]] if nulls_first else [positions[~nulls], positions[nulls]])
+
+def make_handler(tables):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            # postgrest-py sends a JSON body with GETs; drain it so keep-alive connections stay in sync
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            url = urlparse(self.path)
+            prefix = '/rest/v1/'
+            table = tables.get(url.path[len(prefix):]) if url.path.startswith(prefix) else None
+            if table is None:
+                return self.send_json(404, json.dumps({"message": f"Unknown path {url.path}"}).encode('utf-8'))
+
+            filters, order, limit, columns = [], None, None, '*'
+            try:
+                for key, value in parse_qsl(url.query):
+                    if key == 'select':
+                        columns = value
+                        continue
+                    if key == 'limit':
+                        limit = int(value)
+                        continue
+                    if key == 'order':
+                        order = value
+                        continue
+                    op, _, operand = value.partition('.')
+                    if op not in OPERATORS:
+                        raise ValueError(f"Unsupported operator: {op}")
+                    filters.append((key, op, operand))
+                body = table.select(filters, order, limit, columns)
+            except ValueError as e:
+                return self.send_json(400, json.dumps({"message": str(e)}).encode('utf-8'))
+            self.send_json(200, body)
+
+        def send_json(self, status, body):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return Handler
+
+def start_server(rows, host='127.0.0.1', port=0, max_rows=None):
+    """
+    Serve the rows as scraped_property_data_v2 on a background thread.
+    Returns the server; its URL is f'http://{host}:{server.server_port}'.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler({TABLE: PropertyTable(rows, max_rows)}))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--latitude', type=float, default=53.29)
+    parser.add_argument('--longitude', type=float, default=-6.2)
+    parser.add_argument('--spread-km', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--max-rows', type=int, help='Cap on rows per response, like PostgREST max-rows')
+    args = parser.parse_args()
+
+    rows = make_properties(args.rows, args.latitude, args.longitude, args.spread_km, args.seed)
+    server = start_server(rows, args.host, args.port, args.max_rows)
+    print(f"Serving {args.rows} synthetic rows of {TABLE} at http://{args.host}:{server.server_port}")
+    print(f"SUPABASE_URL=http://{args.host}:{server.server_port} SUPABASE_ANON_KEY={ANON_KEY}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Open-loop load generator for the Python API.
+
+Sends a mix of /generate_columns, /valuation, /predict and /predict_batch requests at
+a target rate and reports throughput, latency percentiles, error rates and the
+per-stage breakdown the service returns in its Server-Timing header.
+
+Latency is measured from each request's scheduled send time, so queueing inside
+the harness when the service falls behind is counted rather than hidden.
+
+Usage:
+    # Everything in-process: fake Supabase + Flask app on local ports
+    python benchmarks/loadtest.py --local --rps 20 --duration 30
+
+    # Against a running service (e.g. gunicorn main:app pointed at fake_supabase.py)
+    python benchmarks/loadtest.py --url http://127.0.0.1:8080 --rps 50 --duration 60 \\
+        --mix generate_columns=4,predict=4,predict_batch=1
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.synthetic import make_prediction_rows, make_properties
+from timing import parse_server_timing
+
+ENDPOINTS = ['generate_columns', 'valuation', 'predict', 'predict_batch']
+
+def make_payloads(endpoint, count, locations, batch_size, latitude, longitude, spread_km, seed=0):
+    """
+    Pre-encode request bodies so the harness spends its time sending, not building JSON.
+    """
+    rng = np.random.default_rng(seed)
+    if endpoint in ('generate_columns', 'valuation'):
+        points = [(latitude + rng.uniform(-1, 1) * spread_km / 111.32,
+                   longitude + rng.uniform(-1, 1) * spread_km / (111.32 * np.cos(np.radians(latitude))))
+                  for _ in range(locations)]
+        bodies = []
+        for i in range(count):
+            # Payloads repeat every `locations` requests so identical keys can coalesce
+            point = i % len(points)
+            point_latitude, point_longitude = points[point]
+            bodies.append({
+                'beds': 1 + point % 5,
+                'baths': 2,
+                'size': '110',
+                'property_type': 'house',
+                'ber_rating': 'B2',
+                'latitude': round(float(point_latitude), 7),
+                'longitude': round(float(point_longitude), 7),
+            })
+    elif endpoint == 'predict':
+        bodies = make_prediction_rows(count, seed)
+    else:
+        bodies = [{'rows': make_prediction_rows(batch_size, seed + i)} for i in range(count)]
+    return [json.dumps(body).encode('utf-8') for body in bodies]
+
+class Client:
+    """
+    One keep-alive HTTP connection per harness thread.
+    """
+
+    def __init__(self, base_url, timeout):
+        self.url = urlparse(base_url)
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def post(self, path, body):
+        for attempt in range(2):
+            connection = getattr(self.local, 'connection', None)
+            if connection is None:
+                connection = self.local.connection = http.client.HTTPConnection(
+                    self.url.hostname, self.url.port or 80, timeout=self.timeout)
+            try:
+                connection.request('POST', path, body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                return response.status, response.getheader('Server-Timing')
+            except (http.client.HTTPException, ConnectionError, OSError):
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+
+def run(base_url, rps, duration, mix, concurrency, payloads, timeout):
+    client = Client(base_url, timeout)
+    endpoints = list(mix)
+    weights = np.array([mix[endpoint] for endpoint in endpoints], dtype=float)
+    total = int(rps * duration)
+    rng = np.random.default_rng(1)
+    schedule = rng.choice(len(endpoints), size=total, p=weights / weights.sum())
+
+    results = []
+    lock = threading.Lock()
+
+    def send(index, endpoint, scheduled):
+        body = payloads[endpoint][index % len(payloads[endpoint])]
+        try:
+            status, server_timing = client.post(f'/{endpoint}', body)
+            error = None if 200 <= status < 300 else f'HTTP {status}'
+        except Exception as e:
+            status, server_timing, error = None, None, type(e).__name__
+        record = (endpoint, time.perf_counter() - scheduled, error, parse_server_timing(server_timing))
+        with lock:
+            results.append(record)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, endpoint_index in enumerate(schedule):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, i, endpoints[endpoint_index], scheduled)
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+def summarize(results, elapsed):
+    by_endpoint = defaultdict(list)
+    for record in results:
+        by_endpoint[record[0]].append(record)
+
+    summary = {}
+    for endpoint, records in sorted(by_endpoint.items()):
+        latencies = np.array([record[1] for record in records]) * 1e3
+        errors = defaultdict(int)
+        for record in records:
+            if record[2]:
+                errors[record[2]] += 1
+        stages = defaultdict(list)
+        for record in records:
+            for name, milliseconds in record[3].items():
+                stages[name].append(milliseconds)
+
+        summary[endpoint] = {
+            'requests': len(records),
+            'throughput_rps': round(sum(1 for record in records if not record[2]) / elapsed, 2),
+            'error_rate': round(sum(errors.values()) / len(records), 4),
+            'errors': dict(errors),
+            'latency_ms': {name: round(float(np.percentile(latencies, q)), 2)
+                           for name, q in [('p50', 50), ('p90', 90), ('p99', 99), ('max', 100)]},
+            'stages_ms': {name: {'mean': round(float(np.mean(values)), 2), 'p90': round(float(np.percentile(values, 90)), 2),
+                                 'share': round(len(values) / len(records), 2)}
+                          for name, values in stages.items()},
+        }
+    return summary
+
+def print_summary(summary, elapsed):
+    print(f"\nDuration {elapsed:.1f}s")
+    print(f"{'endpoint':<18}{'requests':>9}{'ok/s':>9}{'errors':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, stats in summary.items():
+        latency = stats['latency_ms']
+        print(f"{endpoint:<18}{stats['requests']:>9}{stats['throughput_rps']:>9.1f}{stats['error_rate']:>9.1%}"
+              f"{latency['p50']:>10.1f}{latency['p90']:>10.1f}{latency['p99']:>10.1f}{latency['max']:>10.1f}")
+    print("\nPer-stage breakdown (Server-Timing; share = fraction of requests reporting the stage)")
+    for endpoint, stats in summary.items():
+        for name, stage_stats in stats['stages_ms'].items():
+            print(f"  {endpoint:<18}{name:<16} mean {stage_stats['mean']:>8.2f} ms  p90 {stage_stats['p90']:>8.2f} ms"
+                  f"  share {stage_stats['share']:.0%}")
+        for error, count in stats['errors'].items():
+            print(f"  {endpoint:<18}error {error}: {count}")
+
+def start_local_service(rows, latitude, longitude, spread_km):
+    """
+    Start the fake Supabase server and the Flask app (threaded) on free local ports.
+    """
+    from werkzeug.serving import make_server
+    from benchmarks.fake_supabase import ANON_KEY, start_server
+
+    supabase_server = start_server(make_properties(rows, latitude, longitude, spread_km))
+    os.environ['SUPABASE_URL'] = f'http://127.0.0.1:{supabase_server.server_port}'
+    os.environ['SUPABASE_ANON_KEY'] = ANON_KEY
+
+    from main import app
+    # The per-request INFO/WARNING logs would drown the report
+    logging.disable(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        endpoint, _, weight = part.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {endpoint}; choose from {ENDPOINTS}")
+        mix[endpoint] = float(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help='Base URL of the service under test')
+    parser.add_argument('--local', action='store_true', help='Start fake Supabase + the Flask app in-process')
+    parser.add_argument('--rps', type=float, default=10.0)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds')
+    parser.add_argument('--concurrency', type=int, default=64, help='Maximum requests in flight')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('generate_columns=1,predict=1'))
+    parser.add_argument('--batch-size', type=int, default=100, help='Rows per /predict_batch request')
+    parser.add_argument('--locations', type=int, default=1000,
+                        help='Distinct coordinates for /generate_columns and /valuation (fewer = more coalescing)')
+    parser.add_argument('--rows', type=int, default=50000, help='Synthetic rows seeded into the local fake Supabase')
+    parser.add_argument('--latitude', type=float, default=53.29)
+    parser.add_argument('--longitude', type=float, default=-6.2)
+    parser.add_argument('--spread-km', type=float, default=10.0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', help='Also write the summary to this file')
+    args = parser.parse_args()
+
+    base_url = args.url
+    if args.local:
+        base_url = start_local_service(args.rows, args.latitude, args.longitude, args.spread_km)
+        print(f"Local service at {base_url}")
+
+    payload_count = min(int(args.rps * args.duration) or 1, 2000)
+    payloads = {endpoint: make_payloads(endpoint, payload_count, args.locations, args.batch_size,
+                                        args.latitude, args.longitude, args.spread_km * 0.5)
+                for endpoint in args.mix}
+
+    results, elapsed = run(base_url, args.rps, args.duration, args.mix, args.concurrency, payloads, args.timeout)
+    summary = summarize(results, elapsed)
+    print_summary(summary, elapsed)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'elapsed_s': elapsed, 'target_rps': args.rps, 'endpoints': summary}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Synthetic scraped_property_data_v2 rows for benchmarks and local testing.
+"""
+import numpy as np
+import pandas as pd
+
+BER_RATINGS = ['A1', 'A2', 'A3', 'B1', 'B2', 'B3', 'C1', 'C2', 'C3', 'D1', 'D2', 'E1', 'E2', 'F', 'G', 'SI_666', None]
+PROPERTY_TYPES = ['Semi-D', 'Terrace', 'Apartment', 'Detached', 'End of Terrace', 'Bungalow', 'Duplex', 'Townhouse', 'Site', None]
+
+def make_properties(n, latitude=53.29, longitude=-6.2, spread_km=5.0, seed=0):
+    """
+    Build n property rows shaped like the Supabase response, scattered around a point.
+
+    Values use the same loose types the table returns (numbers, numeric strings,
+    '3 Bed' style counts, ISO dates and missing values).
+    """
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp.now().normalize()
+    lat_spread = spread_km / 111.32
+    lon_spread = spread_km / (111.32 * np.cos(np.radians(latitude)))
+
+    latitudes = latitude + rng.uniform(-lat_spread, lat_spread, n)
+    longitudes = longitude + rng.uniform(-lon_spread, lon_spread, n)
+    sale_prices = rng.normal(450000, 120000, n).round(-3)
+    asking_prices = (sale_prices * rng.normal(0.97, 0.05, n)).round(-3)
+    floor_areas = rng.uniform(35, 260, n).round(1)
+    beds = rng.integers(1, 6, n)
+    baths = rng.integers(1, 4, n)
+    days_ago = rng.integers(0, 400, n)
+    days_listed = rng.integers(10, 200, n)
+    ber_ratings = rng.integers(0, len(BER_RATINGS), n)
+    property_types = rng.integers(0, len(PROPERTY_TYPES), n)
+    missing = rng.random((n, 3))
+
+    properties = []
+    for i in range(n):
+        sale_date = now - pd.Timedelta(days=int(days_ago[i]))
+        properties.append({
+            'id': i,
+            'latitude': float(latitudes[i]),
+            'longitude': float(longitudes[i]),
+            'sale_price': None if missing[i, 0] < 0.05 else float(sale_prices[i]),
+            'asking_price': float(asking_prices[i]),
+            'first_list_price': None if missing[i, 1] < 0.3 else float(asking_prices[i]),
+            'myhome_floor_area_value': None if missing[i, 2] < 0.2 else float(floor_areas[i]),
+            'beds': f'{beds[i]} Bed',
+            'baths': f'{baths[i]} Bath',
+            'sale_date': sale_date.strftime('%Y-%m-%d'),
+            'first_list_date': (sale_date - pd.Timedelta(days=int(days_listed[i]))).strftime('%Y-%m-%d'),
+            'ber_rating': BER_RATINGS[ber_ratings[i]],
+            'property_type': PROPERTY_TYPES[property_types[i]],
+            'address': f'{i} Synthetic Road, Dublin',
+        })
+    return properties
+
+def make_prediction_rows(n, seed=0):
+    """
+    Build n predict() inputs: original inputs plus the nearby property counts.
+    """
+    rng = np.random.default_rng(seed)
+    return [{
+        'originalInputs': {
+            'beds': str(rng.integers(1, 6)),
+            'baths': str(rng.integers(1, 4)),
+            'size': str(rng.integers(40, 250)),
+            'latitude': str(53.29 + rng.normal(0, 0.05)),
+            'longitude': str(-6.2 + rng.normal(0, 0.05)),
+            'property_type': str(rng.choice(['House', 'Apartment', 'Bungalow'])),
+            'ber_rating': str(rng.choice(['A2', 'B1', 'C2', 'D1', 'E1'])),
+        },
+        'nearby_properties_count_within_1km': int(rng.integers(0, 300)),
+        'nearby_properties_count_within_3km': int(rng.integers(300, 2000)),
+        'nearby_properties_count_within_5km': int(rng.integers(2000, 6000)),
+    } for _ in range(n)]
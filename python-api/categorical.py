@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+# ======================================
+# Category vocabularies
+# ======================================
+
+# Codes are the index into these lists; 'Unknown' is the code for missing or unparseable values
+BER_CATEGORIES = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'Unknown']
+PROPERTY_TYPE_CATEGORIES = ['Apartment', 'House', 'Other', 'Unknown']
+BED_CATEGORIES = ['Studio/1 Bed', '2 Bed', '3 Bed', '4+ Bed', 'Unknown']
+BATH_CATEGORIES = ['1 or less', '2', '3', '4 or more', 'Unknown']
+SIZE_CATEGORIES = ['Small', 'Medium', 'Large', 'Very Large', 'Unknown']
+
+# ======================================
+# Lookup tables
+# ======================================
+
+BER_CATEGORY_BY_RATING = {
+    rating: rating[0]
+    for rating in ['A1', 'A2', 'A3', 'A', 'B1', 'B2', 'B3', 'B', 'C1', 'C2', 'C3', 'C',
+                   'D1', 'D2', 'D', 'E1', 'E2', 'E', 'F', 'G']
+}
+
+PROPERTY_TYPE_CATEGORY_BY_TYPE = {
+    **{property_type: 'Apartment' for property_type in ['apartment', 'flat', 'studio']},
+    **{property_type: 'House' for property_type in ['house', 'bungalow', 'cottage', 'villa', 'townhouse', 'end of terrace',
+                                                   'terrace', 'semi-d', 'detached', 'duplex', 'semi-detached']},
+}
+
+# A1 is the best (highest value), G is the worst (lowest value)
+BER_ORDER = ['A', 'A1', 'A2', 'A3', 'B', 'B1', 'B2', 'B3',
+             'C', 'C1', 'C2', 'C3', 'D', 'D1', 'D2',
+             'E', 'E1', 'E2', 'F', 'G']
+BER_NUMERIC_BY_RATING = {ber: float(len(BER_ORDER) - i) for i, ber in enumerate(BER_ORDER)}
+
+SIZE_BINS = [50, 100, 150]
+
+# ======================================
+# Scalar encoders
+# ======================================
+
+def ber_category(ber_rating):
+    if not ber_rating or not isinstance(ber_rating, str):
+        return 'Unknown'
+    return BER_CATEGORY_BY_RATING.get(ber_rating.upper().strip(), 'Unknown')
+
+def property_type_category(property_type):
+    if not property_type or not isinstance(property_type, str):
+        return 'Unknown'
+    return PROPERTY_TYPE_CATEGORY_BY_TYPE.get(property_type.lower().strip(), 'Other')
+
+def bed_category(beds):
+    try:
+        beds = int(beds)
+    except (ValueError, TypeError):
+        return 'Unknown'
+    return BED_CATEGORIES[min(max(beds, 1), 4) - 1]
+
+def bath_category(baths):
+    if pd.isna(baths):
+        return 'Unknown'
+    try:
+        baths = int(baths)
+    except (ValueError, TypeError):
+        return 'Unknown'
+    return BATH_CATEGORIES[min(max(baths, 1), 4) - 1]
+
+def size_category(size):
+    try:
+        size = float(size)
+    except (ValueError, TypeError):
+        return 'Unknown'
+    if np.isnan(size):
+        return 'Unknown'
+    return SIZE_CATEGORIES[int(np.searchsorted(SIZE_BINS, size, side='right'))]
+
+def ber_numeric(ber):
+    if not isinstance(ber, str):
+        return np.nan
+    return BER_NUMERIC_BY_RATING.get(ber, np.nan)
+
+# ======================================
+# Vectorized encoders
+# ======================================
+
+def _encode_distinct(values, encode, categories):
+    """
+    Encode values by applying the scalar encoder once per distinct value.
+    Returns int8 codes into categories.
+    """
+    codes, distinct = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    index = {category: code for code, category in enumerate(categories)}
+    table = np.array([index[encode(value)] for value in distinct] + [index[encode(None)]], dtype=np.int8)
+    return table[codes]
+
+def encode_ber_categories(values):
+    return _encode_distinct(values, ber_category, BER_CATEGORIES)
+
+def encode_property_type_categories(values):
+    return _encode_distinct(values, property_type_category, PROPERTY_TYPE_CATEGORIES)
+
+def encode_bed_categories(values):
+    return _encode_distinct(values, bed_category, BED_CATEGORIES)
+
+def encode_bath_categories(values):
+    return _encode_distinct(values, bath_category, BATH_CATEGORIES)
+
+def encode_size_categories(values):
+    sizes = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    codes = np.searchsorted(SIZE_BINS, sizes, side='right').astype(np.int8)
+    codes[np.isnan(sizes)] = SIZE_CATEGORIES.index('Unknown')
+    return codes
+
+def encode_ber_numeric(values):
+    return pd.Series(values, dtype=object).map(BER_NUMERIC_BY_RATING).to_numpy(dtype=np.float64, na_value=np.nan)
+
+def decode(codes, categories):
+    """
+    Map integer codes back to their category labels.
+    """
+    return np.asarray(categories, dtype=object)[codes]
+
+# ======================================
+# Feature schema
+# ======================================
+
+# Derived categorical features: feature name -> (input key, scalar encoder, vectorized encoder, vocabulary)
+CATEGORY_FEATURES = {
+    'bedCategory': ('beds', bed_category, encode_bed_categories, BED_CATEGORIES),
+    'bathCategory': ('baths', bath_category, encode_bath_categories, BATH_CATEGORIES),
+    'propertyTypeCategory': ('property_type', property_type_category, encode_property_type_categories, PROPERTY_TYPE_CATEGORIES),
+    'berCategory': ('ber_rating', ber_category, encode_ber_categories, BER_CATEGORIES),
+    'sizeCategory': ('size', size_category, encode_size_categories, SIZE_CATEGORIES),
+}
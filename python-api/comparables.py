@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from categorical import (
+    BER_CATEGORIES, PROPERTY_TYPE_CATEGORIES, decode, encode_ber_categories, encode_property_type_categories,
+)
+
+EARTH_RADIUS_KM = 6371.0
+
+FLOAT64_COLUMNS = ['sale_price', 'asking_price', 'first_list_price', 'myhome_floor_area_value']
+DATE_COLUMNS = ['sale_date', 'first_list_date']
+# Category column -> (source field, vectorized encoder, vocabulary)
+CATEGORY_COLUMNS = {
+    'ber_category': ('ber_rating', encode_ber_categories, BER_CATEGORIES),
+    'property_type_category': ('property_type', encode_property_type_categories, PROPERTY_TYPE_CATEGORIES),
+}
+
+def haversine_distances(latitude, longitude, latitudes, longitudes):
+    """
+    Vectorized Haversine distance in kilometers from one point to arrays of points.
+    """
+    phi1 = np.radians(latitude)
+    phi2 = np.radians(latitudes)
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(longitudes - longitude)
+
+    a = np.sin(delta_phi / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2.0) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def _column(records, key):
+    return pd.Series([record.get(key) for record in records], dtype=object)
+
+def _to_float(values, dtype=np.float64):
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=dtype, na_value=np.nan)
+
+def _to_count(values):
+    """
+    Same as extract_numeric in generate_columns: the first run of digits, or NaN.
+    """
+    present = values[values.notna()].astype(str)
+    digits = pd.to_numeric(present.str.extract(r'(\d+)', expand=False), errors='coerce')
+    return digits.reindex(values.index).to_numpy(dtype=np.float32, na_value=np.nan)
+
+def _to_datetime(values):
+    # PostgREST returns dates/timestamps as ISO 8601 strings
+    dates = pd.to_datetime(values.where(values.astype(bool)), errors='coerce', utc=True, format='ISO8601')
+    return dates.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]')
+
+class Comparables:
+    """
+    Structure-of-arrays container for comparable properties.
+
+    Each column is a typed NumPy array: float64 prices and floor area (so price per
+    square meter matches the pandas path exactly), float32 beds and baths, datetime64
+    dates and int8 category codes (see categorical.py) for BER rating and property type.
+    Rows are sorted by distance from the subject property, so the comparables within
+    a radius are a prefix of every column and within() slices them without copying.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['distance'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_records(cls, records, latitude=None, longitude=None, radius_km=None):
+        """
+        Decode a list of property dicts (e.g. a Supabase response.data) once.
+
+        Rows without valid coordinates are dropped. When the subject coordinates are
+        given, rows are sorted by distance and those beyond radius_km are dropped.
+        """
+        latitudes = _to_float(_column(records, 'latitude'))
+        longitudes = _to_float(_column(records, 'longitude'))
+        if latitude is not None and longitude is not None:
+            distance = haversine_distances(float(latitude), float(longitude), latitudes, longitudes)
+        else:
+            distance = np.zeros(len(records))
+
+        keep = ~(np.isnan(latitudes) | np.isnan(longitudes) | np.isnan(distance))
+        if radius_km is not None:
+            keep &= distance <= radius_km
+        index = np.flatnonzero(keep)
+        index = index[np.argsort(distance[index], kind='stable')]
+
+        columns = {
+            'distance': distance[index],
+            'latitude': latitudes[index],
+            'longitude': longitudes[index],
+        }
+        records = [records[i] for i in index]
+        for name in FLOAT64_COLUMNS:
+            columns[name] = _to_float(_column(records, name))
+        for name in ['beds', 'baths']:
+            columns[name] = _to_count(_column(records, name))
+        for name in DATE_COLUMNS:
+            columns[name] = _to_datetime(_column(records, name))
+        for name, (field, encode, _) in CATEGORY_COLUMNS.items():
+            columns[name] = encode(_column(records, field))
+
+        return cls(columns)
+
+    @classmethod
+    def empty(cls):
+        return cls.from_records([])
+
+    @classmethod
+    def concat(cls, parts):
+        columns = {name: np.concatenate([part.columns[name] for part in parts]) for name in parts[0].columns}
+        return cls(columns)
+
+    def within(self, radius_km):
+        """
+        Comparables within radius_km of the subject property, as views on this container.
+        """
+        end = int(np.searchsorted(self.columns['distance'], radius_km, side='right'))
+        return Comparables({name: values[:end] for name, values in self.columns.items()})
+
+    def take(self, mask):
+        return Comparables({name: values[mask] for name, values in self.columns.items()})
+
+    def sold(self):
+        """
+        Comparables with a sale price, i.e. the rows the market metrics are computed on.
+        """
+        return self.take(~np.isnan(self.columns['sale_price']))
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+    def to_frame(self):
+        df = pd.DataFrame(self.columns)
+        for name, (_, _, categories) in CATEGORY_COLUMNS.items():
+            df[name] = decode(self.columns[name], categories)
+        return df
@@ -12,6 +12,14 @@ from supabase import create_client, Client
 import pandas as pd
 import numpy as np
 from flask import jsonify
+from serialization import json_response
+from comparables import Comparables
+from aggregates import MARKET_TREND_DAYS, WINDOWS, ComparablesAggregate
+from timing import stage
+from categorical import (
+    BER_CATEGORIES, PROPERTY_TYPE_CATEGORIES, bath_category, bed_category, ber_category,
+    ber_numeric, property_type_category, size_category,
+)
 from datetime import datetime, timedelta
 import re
 
@@ -32,13 +40,29 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 if not SUPABASE_URL:
     logging.error("SUPABASE_URL is missing in the environment variables.")
     raise ValueError("SUPABASE_URL is missing in the environment variables.")
-if not SUPABASE_URL.startswith('https://'):
+# http:// is allowed so a local stand-in (benchmarks/fake_supabase.py) can be used
+if not SUPABASE_URL.startswith(('https://', 'http://')):
     SUPABASE_URL = 'https://' + SUPABASE_URL
 
 if not SUPABASE_ANON_KEY:
     logging.error("Supabase credentials are missing in the environment variables.")
     raise ValueError("Supabase credentials are missing in the environment variables.")
 
+# Comparables search: 'fixed' always fetches the full largest radius; 'streaming'
+# aggregates the full largest radius in chunks with bounded memory (see
+# fetch_comparables_aggregates); 'adaptive' (opt-in) grows the radius until enough
+# recent sales are found (see fetch_comparables_adaptive), so the metrics of the outer
+# radii are approximated from the inner comparables
+COMPARABLES_SEARCH = os.getenv("COMPARABLES_SEARCH", "fixed")
+MIN_RECENT_SALES = int(os.getenv("COMPARABLES_MIN_RECENT_SALES", "30"))
+MAX_COMPARABLE_ROWS = int(os.getenv("COMPARABLES_MAX_ROWS", "5000"))
+COMPARABLES_CHUNK_SIZE = int(os.getenv("COMPARABLES_CHUNK_SIZE", "1000"))
+# PostgREST's max-rows setting (Supabase defaults to 1000): no response holds more rows
+POSTGREST_MAX_ROWS = int(os.getenv("POSTGREST_MAX_ROWS", "1000"))
+RECENT_SALE_DAYS = 365
+# PostgreSQL sorts NULLs first for DESC; the client has no nullslast flag, so spell it out
+RECENT_SALES_FIRST = "sale_date.desc.nullslast"
+
 # Initialize Supabase client
 try:
     supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
@@ -52,88 +76,31 @@ except Exception as e:
 # ======================================
 
 def get_property_type_category(property_type):
-    if not property_type:
-        return 'Unknown'
-    property_type = property_type.lower().strip()
-    if property_type in ['apartment', 'flat', 'studio']:
-        return 'Apartment'
-    elif property_type in ['house', 'bungalow', 'cottage', 'villa', 'townhouse', 'end of terrace', 'terrace', 'semi-d', 'detached', 'duplex', 'semi-detached']:
-        return 'House'
-    else:
-        return 'Other'
+    return property_type_category(property_type)
 
 def get_bed_category(beds):
-    try:
-        beds = int(beds)
-    except (ValueError, TypeError):
+    category = bed_category(beds)
+    if category == 'Unknown':
         logging.warning(f"Invalid bed count: {beds}")
-        return "Unknown"
-    if beds <= 1:
-        return "Studio/1 Bed"
-    elif beds == 2:
-        return "2 Bed"
-    elif beds == 3:
-        return "3 Bed"
-    else:
-        return "4+ Bed"
+    return category
 
 def get_bath_category(baths):
     """
     Categorize the number of bathrooms.
     """
-    if pd.isna(baths):
-        return 'Unknown'
-    try:
-        baths = int(baths)
-        if baths <= 1:
-            return '1 or less'
-        elif baths == 2:
-            return '2'
-        elif baths == 3:
-            return '3'
-        else:
-            return '4 or more'
-    except ValueError:
-        return 'Unknown'
+    return bath_category(baths)
 
 def get_ber_category(ber_rating):
     """
     Categorize BER ratings based on the provided rating.
     """
-    if not ber_rating:
-        return 'Unknown'
-    ber_rating = ber_rating.upper().strip()
-    if ber_rating in ['A1', 'A2', 'A3', 'A']:
-        return 'A'
-    elif ber_rating in ['B1', 'B2', 'B3', 'B']:
-        return 'B'
-    elif ber_rating in ['C1', 'C2', 'C3', 'C']:
-        return 'C'
-    elif ber_rating in ['D1', 'D2', 'D']:
-        return 'D'
-    elif ber_rating in ['E1', 'E2', 'E']:
-        return 'E'
-    elif ber_rating == 'F':
-        return 'F'
-    elif ber_rating == 'G':
-        return 'G'
-    else:
-        return 'Unknown'
+    return ber_category(ber_rating)
 
 def get_size_category(size):
-    try:
-        size = float(size)
-    except (ValueError, TypeError):
+    category = size_category(size)
+    if category == 'Unknown':
         logging.warning(f"Invalid size value: {size}")
-        return 'Unknown'
-    if size < 50:
-        return 'Small'
-    elif 50 <= size < 100:
-        return 'Medium'
-    elif 100 <= size < 150:
-        return 'Large'
-    else:
-        return 'Very Large'
+    return category
 
 def haversine_distance(lat1, lon1, lat2, lon2):
     """
@@ -176,25 +143,7 @@ def ber_to_numeric(ber):
     Convert BER rating to a numeric value.
     A1 is the best (highest value), G is the worst (lowest value).
     """
-    ber_order = ['A', 'A1', 'A2', 'A3', 'B', 'B1', 'B2', 'B3', 
-                'C', 'C1', 'C2', 'C3', 'D', 'D1', 'D2', 
-                'E', 'E1', 'E2', 'F', 'G']
-    if pd.isna(ber) or ber == '--' or ber not in ber_order:
-        return np.nan
-    return float(len(ber_order) - ber_order.index(ber))
-
-def replace_nan(obj):
-    """
-    Recursively replace NaN values with None in dictionaries and lists.
-    """
-    if isinstance(obj, float) and math.isnan(obj):
-        return None
-    elif isinstance(obj, dict):
-        return {k: replace_nan(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [replace_nan(element) for element in obj]
-    else:
-        return obj
+    return ber_numeric(ber)
 
 def calculate_days_on_market(first_list_date, sale_date):
     """
@@ -254,147 +203,300 @@ def preprocess_property_data(prop):
         logging.error(f"Error in preprocess_property_data for property ID {prop.get('id', 'N/A')}: {e}")
         return prop
 
-def fetch_nearby_properties(latitude, longitude, radius_km):
+def query_bounding_box(latitude, longitude, radius_km, limit=None, order=RECENT_SALES_FIRST, after_id=None, columns="*"):
     """
-    Fetch nearby properties within a specified radius from Supabase.
+    Query Supabase for all properties in the bounding box around a point.
+    With a limit, at most that many rows are returned in the given order (by default
+    the most recent sales first, unsold listings last). after_id only returns ids
+    above it, for paging through the box in id order. columns selects a subset of
+    the columns, e.g. only the coordinates.
+    """
+    # Calculate the approximate bounding box
+    lat_range = radius_km / 111.32  # 1 degree of latitude is approximately 111.32 km
+    if math.cos(math.radians(latitude)) == 0:
+        lon_range = 0
+    else:
+        lon_range = radius_km / (111.32 * math.cos(math.radians(latitude)))
+    
+    min_lat = latitude - lat_range
+    max_lat = latitude + lat_range
+    min_lon = longitude - lon_range
+    max_lon = longitude + lon_range
+    
+    # Query the database using the bounding box
+    query = supabase.table("scraped_property_data_v2") \
+        .select(columns) \
+        .gte("latitude", min_lat) \
+        .lte("latitude", max_lat) \
+        .gte("longitude", min_lon) \
+        .lte("longitude", max_lon)
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    if limit is not None:
+        query = query.order(order).limit(limit)
+    response = query.execute()
+    
+    logging.info(f"Properties within bounding box: {len(response.data)}")
+    return response.data
+
+def fetch_comparables(latitude, longitude, radius_km, chunk_size=COMPARABLES_CHUNK_SIZE):
+    """
+    Fetch nearby properties within a specified radius as a columnar Comparables container.
+    The box is paged like iterate_bounding_box, so PostgREST's max-rows cap cannot truncate
+    it. Rows are decoded once; use Comparables.within() to slice smaller radii.
     """
     try:
-        logging.info(f"Fetching properties within {radius_km} KM of ({latitude}, {longitude})")
-        
-        # Calculate the approximate bounding box
-        lat_range = radius_km / 111.32  # 1 degree of latitude is approximately 111.32 km
-        if math.cos(math.radians(latitude)) == 0:
-            lon_range = 0
-        else:
-            lon_range = radius_km / (111.32 * math.cos(math.radians(latitude)))
-        
-        min_lat = latitude - lat_range
-        max_lat = latitude + lat_range
-        min_lon = longitude - lon_range
-        max_lon = longitude + lon_range
-        
-        # Query the database using the bounding box
-        response = supabase.table("scraped_property_data_v2") \
-            .select("*") \
-            .gte("latitude", min_lat) \
-            .lte("latitude", max_lat) \
-            .gte("longitude", min_lon) \
-            .lte("longitude", max_lon) \
-            .execute()
-        
-        all_properties = response.data
-        logging.info(f"Properties within bounding box: {len(all_properties)}")
-        
-        nearby_properties = []
-        for prop in all_properties:
-            prop_lat = prop.get('latitude')
-            prop_lon = prop.get('longitude')
-            if prop_lat is not None and prop_lon is not None:
-                try:
-                    prop_lat = float(prop_lat)
-                    prop_lon = float(prop_lon)
-                    distance = calculate_distance(latitude, longitude, prop_lat, prop_lon)
-                    if distance is not None and distance <= radius_km:
-                        nearby_properties.append(prop)
-                except ValueError:
-                    logging.warning(f"Invalid coordinates for property: {prop.get('id')}")
-            else:
-                logging.debug(f"Skipping property with missing coordinates: {prop.get('id')}")
-        
-        logging.info(f"Number of nearby properties found within {radius_km}km: {len(nearby_properties)}")
-        return nearby_properties
+        logging.info(f"Fetching comparables within {radius_km} KM of ({latitude}, {longitude})")
+        all_properties = [prop for page in iterate_bounding_box(latitude, longitude, radius_km, chunk_size) for prop in page]
+        with stage('decode'):
+            comparables = Comparables.from_records(all_properties, latitude, longitude, radius_km=radius_km)
+        logging.info(f"Number of comparables found within {radius_km}km: {len(comparables)} ({comparables.nbytes} bytes)")
+        return comparables
     except Exception as e:
-        logging.error(f"Error fetching nearby properties: {e}")
+        logging.error(f"Error fetching comparables: {e}")
         logging.error(traceback.format_exc())
-        return []
+        return Comparables.empty()
 
-def calculate_time_based_metrics(df, days, radius):
+def count_recent_sales(comparables, days=RECENT_SALE_DAYS):
+    """
+    Number of comparables with a sale price that sold within the last `days` days.
+    """
+    cutoff = np.datetime64(datetime.now() - timedelta(days=days))
+    return int(np.count_nonzero(~np.isnan(comparables['sale_price']) & (comparables['sale_date'] >= cutoff)))
+
+def fetch_comparables_adaptive(latitude, longitude, radii, min_recent_sales=MIN_RECENT_SALES, max_rows=MAX_COMPARABLE_ROWS):
+    """
+    Fetch comparables starting at the smallest radius and growing only while fewer than
+    min_recent_sales recent sales have been found.
+
+    Each query returns at most max_rows rows (or PostgREST's max-rows, if lower), most
+    recent sales first, so dense areas stop at a small radius with a bounded row count.
+    A full response means the box held more rows, so its comparables are incomplete. In sparse areas the next radius is the first
+    one expected (by scaling the sales found so far with area) to reach the target, so an
+    empty inner box jumps straight to the largest radius.
+
+    Returns (comparables, searched radius in km, whether the response was capped).
+    """
+    page_size = min(max_rows, POSTGREST_MAX_ROWS)
+    try:
+        radius = radii[0]
+        while True:
+            logging.info(f"Fetching comparables within {radius} KM of ({latitude}, {longitude})")
+            with stage('supabase_query'):
+                all_properties = query_bounding_box(latitude, longitude, radius, limit=page_size)
+            with stage('decode'):
+                comparables = Comparables.from_records(all_properties, latitude, longitude, radius_km=radius)
+            recent_sales = count_recent_sales(comparables)
+            logging.info(f"Number of comparables found within {radius}km: {len(comparables)} ({recent_sales} recent sales)")
+
+            larger = [r for r in radii if r > radius]
+            capped = len(all_properties) >= page_size
+            if capped or recent_sales >= min_recent_sales or not larger:
+                return comparables, radius, capped
+            radius = next((r for r in larger if recent_sales * (r / radius) ** 2 >= min_recent_sales), larger[-1])
+    except Exception as e:
+        logging.error(f"Error fetching comparables: {e}")
+        logging.error(traceback.format_exc())
+        return Comparables.empty(), radii[-1], False
+
+def count_comparables(latitude, longitude, radii, chunk_size=COMPARABLES_CHUNK_SIZE):
+    """
+    Number of properties within each radius, from the coordinates alone.
+
+    Gives the adaptive search the same counts as fetching the largest radius in full,
+    for radii it did not search or whose rows it capped. Only the id and coordinates are
+    fetched, page by page, so max-rows cannot truncate the counts. Returns None if the
+    query fails.
+    """
+    try:
+        counts = dict.fromkeys(radii, 0)
+        for page in iterate_bounding_box(latitude, longitude, max(radii), chunk_size, columns="id,latitude,longitude"):
+            with stage('decode'):
+                comparables = Comparables.from_records(page, latitude, longitude, radius_km=max(radii))
+            for radius in radii:
+                counts[radius] += len(comparables.within(radius))
+        return counts
+    except Exception as e:
+        logging.error(f"Error counting comparables: {e}")
+        logging.error(traceback.format_exc())
+        return None
+
+def iterate_bounding_box(latitude, longitude, radius_km, chunk_size, columns="*"):
+    """
+    Query the bounding box around a point page by page, yielding lists of at most
+    chunk_size properties (with the given columns, which must include id). Pages
+    follow id order, so each property is returned once.
+    Paging stops at the first empty page: PostgREST caps every response at its max-rows
+    setting, so a page shorter than chunk_size does not mean the box is exhausted.
+    """
+    after_id = None
+    while True:
+        with stage('supabase_query'):
+            page = query_bounding_box(latitude, longitude, radius_km, limit=chunk_size, order="id", after_id=after_id, columns=columns)
+        if not page:
+            return
+        yield page
+        after_id = page[-1]['id']
+
+def aggregate_comparables(chunks, latitude, longitude, radii):
+    """
+    Fold chunks of property records into one ComparablesAggregate per radius.
+    Only the running summaries are kept; each chunk is released once it is aggregated.
+    """
+    now = datetime.now()
+    aggregates = {radius: ComparablesAggregate(now) for radius in radii}
+    for records in chunks:
+        with stage('decode'):
+            comparables = Comparables.from_records(records, latitude, longitude, radius_km=max(radii))
+        del records
+        with stage('metrics'):
+            for radius in radii:
+                aggregates[radius].update(comparables.within(radius))
+        del comparables
+    return aggregates
+
+def fetch_comparables_aggregates(latitude, longitude, radii, chunk_size=COMPARABLES_CHUNK_SIZE):
+    """
+    Aggregate the comparables within the largest radius in pages of chunk_size rows, so
+    peak memory does not grow with the number of comparables. Returns {radius: ComparablesAggregate}.
+    """
+    try:
+        logging.info(f"Aggregating comparables within {max(radii)} KM of ({latitude}, {longitude}) in chunks of {chunk_size}")
+        chunks = iterate_bounding_box(latitude, longitude, max(radii), chunk_size)
+        aggregates = aggregate_comparables(chunks, latitude, longitude, radii)
+        logging.info(f"Number of comparables aggregated within {max(radii)}km: {aggregates[max(radii)].rows}")
+        return aggregates
+    except Exception as e:
+        logging.error(f"Error aggregating comparables: {e}")
+        logging.error(traceback.format_exc())
+        now = datetime.now()
+        return {radius: ComparablesAggregate(now) for radius in radii}
+
+def nan_median(values):
+    """
+    Median ignoring NaN; NaN if there are no values (like pandas Series.median).
+    """
+    values = values[~np.isnan(values)]
+    return np.median(values) if len(values) else np.nan
+
+def nan_mean(values):
+    """
+    Mean ignoring NaN; NaN if there are no values (like pandas Series.mean).
+    """
+    values = values[~np.isnan(values)]
+    return values.mean(dtype=np.float64) if len(values) else np.nan
+
+def calculate_days_on_market_column(comparables):
+    """
+    Days between first listing and sale for each comparable (NaN when either date is missing).
+    """
+    return np.floor((comparables['sale_date'] - comparables['first_list_date']) / np.timedelta64(1, 'D'))
+
+def calculate_price_per_square_meter_column(comparables):
+    """
+    Sale price per square meter for each comparable (NaN when the floor area is missing or zero).
+    """
+    area = np.where(comparables['myhome_floor_area_value'] == 0, np.nan, comparables['myhome_floor_area_value'])
+    return comparables['sale_price'] / area
+
+def calculate_time_based_metrics(comparables, days, radius, days_on_market=None, price_per_square_meter=None):
     """
     Calculate time-based metrics for a given number of days and radius.
     """
-    cutoff_date = pd.Timestamp.now() - pd.Timedelta(days=days)
-    recent_df = df[df['sale_date'] >= cutoff_date]
+    if days_on_market is None:
+        days_on_market = calculate_days_on_market_column(comparables)
+    if price_per_square_meter is None:
+        price_per_square_meter = calculate_price_per_square_meter_column(comparables)
+
+    cutoff_date = np.datetime64(pd.Timestamp.now() - pd.Timedelta(days=days))
+    recent = comparables['sale_date'] >= cutoff_date
     
     metrics = {
-        f'{days}d_{radius}km_median_sold_price': recent_df['sale_price'].median(),
-        f'{days}d_{radius}km_avg_asking_price': recent_df['asking_price'].mean(),
-        f'{days}d_{radius}km_num_properties_sold': recent_df['sale_price'].notna().sum(),
-        f'{days}d_{radius}km_avg_days_on_market': recent_df['days_on_market'].mean(),
-        f'{days}d_{radius}km_median_price_per_sqm': recent_df['price_per_square_meter'].median(),
+        f'{days}d_{radius}km_median_sold_price': nan_median(comparables['sale_price'][recent]),
+        f'{days}d_{radius}km_avg_asking_price': nan_mean(comparables['asking_price'][recent]),
+        f'{days}d_{radius}km_num_properties_sold': int((~np.isnan(comparables['sale_price'][recent])).sum()),
+        f'{days}d_{radius}km_avg_days_on_market': nan_mean(days_on_market[recent]),
+        f'{days}d_{radius}km_median_price_per_sqm': nan_median(price_per_square_meter[recent]),
     }
     return metrics
 
+def calculate_distribution(codes, categories):
+    """
+    Percentage of rows in each category, largest first (like value_counts(normalize=True) * 100).
+    """
+    return calculate_distribution_from_counts(np.bincount(codes, minlength=len(categories)), categories)
+
+def calculate_distribution_from_counts(counts, categories):
+    """
+    Percentage of rows in each category from per-category counts, largest first.
+    """
+    order = np.argsort(-counts, kind='stable')
+    return {categories[i]: counts[i] / counts.sum() * 100 for i in order if counts[i]}
+
 def calculate_nearby_metrics(nearby_props, radius):
     """
     Calculate metrics for nearby properties within a specified radius.
+    Accepts a Comparables container or a list of property dicts.
     """
     metrics = {}
     try:
-        df = pd.DataFrame(nearby_props)
+        if not isinstance(nearby_props, Comparables):
+            nearby_props = Comparables.from_records(nearby_props)
         
-        if df.empty:
+        if not len(nearby_props):
             logging.warning(f"No nearby properties found within {radius}km.")
             return metrics
 
-        # Preprocess all properties
-        df = df.apply(preprocess_property_data, axis=1)
-        
-        # Remove properties with failed preprocessing
-        df = df.dropna(subset=['sale_price', 'latitude', 'longitude'])
+        # Only sold properties are used for the metrics
+        comparables = nearby_props.sold()
 
         # Calculate days on market and price per sqm
-        df['days_on_market'] = df.apply(
-            lambda row: calculate_days_on_market(row.get('first_list_date'), row.get('sale_date')), axis=1
-        )
-        df['price_per_square_meter'] = df.apply(
-            lambda row: safe_divide(row.get('sale_price'), row.get('myhome_floor_area_value')), axis=1
-        )
+        days_on_market = calculate_days_on_market_column(comparables)
+        price_per_square_meter = calculate_price_per_square_meter_column(comparables)
         
         # Calculate metrics for different time periods
         for days in [30, 90, 180]:
-            time_metrics = calculate_time_based_metrics(df, days, radius)
+            time_metrics = calculate_time_based_metrics(comparables, days, radius, days_on_market, price_per_square_meter)
             metrics.update(time_metrics)
         
         # BER distribution
-        df['ber_category'] = df['ber_rating'].apply(get_ber_category)
-        ber_dist = df['ber_category'].value_counts(normalize=True) * 100
+        ber_dist = calculate_distribution(comparables['ber_category'], BER_CATEGORIES)
         for ber, percent in ber_dist.items():
             metrics[f'{radius}km_ber_dist_{ber}'] = round(percent, 2)
         
         # Property type distribution
-        df['property_type_category'] = df['property_type'].apply(get_property_type_category)
-        prop_type_dist = df['property_type_category'].value_counts(normalize=True) * 100
+        prop_type_dist = calculate_distribution(comparables['property_type_category'], PROPERTY_TYPE_CATEGORIES)
         for prop_type, percent in prop_type_dist.items():
             metrics[f'{radius}km_property_type_dist_{prop_type}'] = round(percent, 2)
         
         # Other general metrics
+        median_sale_price = nan_median(comparables['sale_price'])
+        avg_first_list_price = nan_mean(comparables['first_list_price'])
         metrics.update({
-            f'{radius}km_avg_property_size': round(df['myhome_floor_area_value'].mean(), 2) if not df['myhome_floor_area_value'].empty else None,
-            f'{radius}km_median_beds': df['beds'].median() if not df['beds'].empty else None,
-            f'{radius}km_median_baths': df['baths'].median() if not df['baths'].empty else None,
-            f'{radius}km_price_to_income_ratio': round(safe_divide(df['sale_price'].median(), 50000), 2) if 'sale_price' in df and 'sale_price' in df else None,  # Assuming median income of 50,000
+            f'{radius}km_avg_property_size': round(nan_mean(comparables['myhome_floor_area_value']), 2) if len(comparables) else None,
+            f'{radius}km_median_beds': nan_median(comparables['beds']) if len(comparables) else None,
+            f'{radius}km_median_baths': nan_median(comparables['baths']) if len(comparables) else None,
+            f'{radius}km_price_to_income_ratio': round(safe_divide(median_sale_price, 50000), 2) if len(comparables) else None,  # Assuming median income of 50,000
             f'{radius}km_price_growth_rate': round(
                 safe_divide(
-                    (df['sale_price'].mean() / df['first_list_price'].mean()) - 1, 
+                    (nan_mean(comparables['sale_price']) / avg_first_list_price) - 1, 
                     1
                 ) * 100, 2
-            ) if df['first_list_price'].mean() else None,
+            ) if avg_first_list_price and not np.isnan(avg_first_list_price) else None,
         })
         
     except Exception as e:
         logging.error(f"Error calculating nearby metrics for radius {radius}: {e}")
     return metrics
 
-def calculate_market_trends(df):
+def calculate_market_trends(comparables):
     """
     Calculate market trends such as percent change over the last 30 days.
     """
     try:
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_sales = df[df['sale_date'] >= thirty_days_ago]
-        older_sales = df[df['sale_date'] < thirty_days_ago]
-        recent_avg = recent_sales['sale_price'].mean()
-        older_avg = older_sales['sale_price'].mean()
+        thirty_days_ago = np.datetime64(datetime.now() - timedelta(days=30))
+        recent_avg = nan_mean(comparables['sale_price'][comparables['sale_date'] >= thirty_days_ago])
+        older_avg = nan_mean(comparables['sale_price'][comparables['sale_date'] < thirty_days_ago])
         if older_avg and older_avg != 0:
             percent_change = ((recent_avg - older_avg) / older_avg) * 100
             return round(percent_change, 2)
@@ -404,36 +506,199 @@ def calculate_market_trends(df):
         logging.error(f"Error calculating market trends: {e}")
         return None
 
-def calculate_price_benchmarks(df, lower_bound, upper_bound):
+def calculate_price_benchmarks(comparables, lower_bound, upper_bound):
     """
     Calculate the ratio of average prices between two areas.
     """
     try:
+        sale_price = comparables['sale_price']
         if upper_bound == 'overall':
-            overall_avg = df['sale_price'].mean()
-            lower_avg = df[df['sale_price'] >= lower_bound]['sale_price'].mean()
+            overall_avg = nan_mean(sale_price)
+            lower_avg = nan_mean(sale_price[sale_price >= lower_bound])
             return round(safe_divide(lower_avg, overall_avg), 2) if overall_avg else None
         else:
-            upper_avg = df[df['sale_price'] <= upper_bound]['sale_price'].mean()
-            lower_avg = df[df['sale_price'] >= lower_bound]['sale_price'].mean()
+            upper_avg = nan_mean(sale_price[sale_price <= upper_bound])
+            lower_avg = nan_mean(sale_price[sale_price >= lower_bound])
             return round(safe_divide(lower_avg, upper_avg), 2) if upper_avg else None
     except Exception as e:
         logging.error(f"Error calculating price benchmarks between {lower_bound} and {upper_bound}: {e}")
         return None
 
-def calculate_price_trend(df, days):
+def calculate_price_trend(comparables, days):
     """
     Calculate the price trend over a specified number of days.
     """
     try:
-        target_date = datetime.now() - timedelta(days=days)
-        target_sales = df[df['sale_date'] >= target_date]
-        trend = target_sales['sale_price'].mean()
-        return round(trend, 2) if not target_sales['sale_price'].empty else None
+        target_date = np.datetime64(datetime.now() - timedelta(days=days))
+        target_prices = comparables['sale_price'][comparables['sale_date'] >= target_date]
+        trend = nan_mean(target_prices)
+        return round(trend, 2) if len(target_prices) else None
     except Exception as e:
         logging.error(f"Error calculating price trend over {days} days: {e}")
         return None
 
+def calculate_aggregate_metrics(aggregate, radius):
+    """
+    Same metrics as calculate_nearby_metrics, from a ComparablesAggregate.
+    """
+    metrics = {}
+    try:
+        if not aggregate.rows:
+            logging.warning(f"No nearby properties found within {radius}km.")
+            return metrics
+
+        for days in WINDOWS:
+            window = aggregate.windows[days]
+            metrics.update({
+                f'{days}d_{radius}km_median_sold_price': window['sale_price'].median(),
+                f'{days}d_{radius}km_avg_asking_price': window['asking_price'].mean,
+                f'{days}d_{radius}km_num_properties_sold': window['sale_price'].count,
+                f'{days}d_{radius}km_avg_days_on_market': window['days_on_market'].mean,
+                f'{days}d_{radius}km_median_price_per_sqm': window['price_per_sqm'].median(),
+            })
+
+        for ber, percent in calculate_distribution_from_counts(aggregate.ber_counts, BER_CATEGORIES).items():
+            metrics[f'{radius}km_ber_dist_{ber}'] = round(percent, 2)
+        for prop_type, percent in calculate_distribution_from_counts(aggregate.property_type_counts, PROPERTY_TYPE_CATEGORIES).items():
+            metrics[f'{radius}km_property_type_dist_{prop_type}'] = round(percent, 2)
+
+        sold = aggregate.sold
+        median_sale_price = aggregate.sale_price.median()
+        avg_first_list_price = aggregate.first_list_price.mean
+        metrics.update({
+            f'{radius}km_avg_property_size': round(aggregate.floor_area.mean, 2) if sold else None,
+            f'{radius}km_median_beds': aggregate.beds.median() if sold else None,
+            f'{radius}km_median_baths': aggregate.baths.median() if sold else None,
+            f'{radius}km_price_to_income_ratio': round(safe_divide(median_sale_price, 50000), 2) if sold else None,  # Assuming median income of 50,000
+            f'{radius}km_price_growth_rate': round(
+                safe_divide(
+                    (aggregate.sale_price.mean / avg_first_list_price) - 1,
+                    1
+                ) * 100, 2
+            ) if avg_first_list_price and not np.isnan(avg_first_list_price) else None,
+        })
+    except Exception as e:
+        logging.error(f"Error calculating aggregate metrics for radius {radius}: {e}")
+    return metrics
+
+def calculate_aggregate_price_benchmarks(sale_price, lower_bound, upper_bound):
+    """
+    calculate_price_benchmarks from a QuantileSketch of sale prices.
+    """
+    try:
+        if upper_bound == 'overall':
+            overall_avg = sale_price.mean
+            lower_avg = sale_price.mean_where(lower=lower_bound)
+            return round(safe_divide(lower_avg, overall_avg), 2) if overall_avg else None
+        else:
+            upper_avg = sale_price.mean_where(upper=upper_bound)
+            lower_avg = sale_price.mean_where(lower=lower_bound)
+            return round(safe_divide(lower_avg, upper_avg), 2) if upper_avg else None
+    except Exception as e:
+        logging.error(f"Error calculating price benchmarks between {lower_bound} and {upper_bound}: {e}")
+        return None
+
+def calculate_aggregate_market_metrics(combined):
+    """
+    Market trend, price benchmarks and price trends from the ComparablesAggregate of all radii.
+    """
+    metrics = {}
+    recent_avg = combined.windows[MARKET_TREND_DAYS]['sale_price'].mean
+    older_avg = combined.older_sale_price.mean
+    metrics['market_trend_30_days'] = round(((recent_avg - older_avg) / older_avg) * 100, 2) \
+        if older_avg and older_avg != 0 else None
+
+    median_sale_price = combined.sale_price.median()
+    metrics['price_benchmark_ratio_low_high'] = calculate_aggregate_price_benchmarks(combined.sale_price, 0, median_sale_price)
+    metrics['price_benchmark_ratio_high_overall'] = calculate_aggregate_price_benchmarks(combined.sale_price, median_sale_price, 'overall')
+
+    for days in WINDOWS:
+        window_sale_price = combined.windows[days]['sale_price']
+        metrics[f'price_trend_{days}_days'] = round(window_sale_price.mean, 2) if window_sale_price.count else None
+    return metrics
+
+def calculate_comparables_columns(latitude, longitude, radii):
+    """
+    Per-radius and market columns from comparables fetched in full (adaptive or fixed search).
+    """
+    columns = {}
+    # Fetch comparables once and slice each radius from them. Radii beyond the adaptive
+    # search radius reuse the comparables it found, so every radius's columns are filled;
+    # their counts come from a coordinates-only query so they match the fixed search.
+    counts = None
+    if COMPARABLES_SEARCH == 'adaptive':
+        comparables, search_radius, capped = fetch_comparables_adaptive(latitude, longitude, radii)
+        if capped or search_radius < max(radii):
+            counts = count_comparables(latitude, longitude, radii)
+            if counts is None:
+                # Never feed the model a count known to be short; a missing value is better
+                counts = {radius: None if capped or radius > search_radius else len(comparables.within(radius))
+                          for radius in radii}
+    else:
+        search_radius = max(radii)
+        comparables = fetch_comparables(latitude, longitude, radius_km=search_radius)
+    columns['comparables_search_radius_km'] = search_radius
+    combined_nearby_props = []
+    for radius in radii:
+        nearby_props = comparables.within(min(radius, search_radius))
+        columns[f'nearby_properties_count_within_{radius}km'] = counts[radius] if counts is not None else len(nearby_props)
+        if len(nearby_props):
+            with stage('metrics'):
+                nearby_metrics = calculate_nearby_metrics(nearby_props, radius)
+            columns.update(nearby_metrics)
+            combined_nearby_props.append(nearby_props)
+        else:
+            logging.warning(f"No nearby properties found within {radius}km to calculate metrics.")
+
+    # Calculate market trends and benchmarks if combined_nearby_props is not empty
+    if combined_nearby_props:
+        with stage('metrics'):
+            # The rings overlap, so inner comparables are weighted once per radius they fall in
+            df_nearby = Comparables.concat(combined_nearby_props).sold()
+
+            # Calculate market trends
+            market_trend = calculate_market_trends(df_nearby)
+            columns['market_trend_30_days'] = market_trend
+
+            # Calculate price benchmarks
+            median_sale_price = nan_median(df_nearby['sale_price'])
+            columns['price_benchmark_ratio_low_high'] = calculate_price_benchmarks(df_nearby, 0, median_sale_price)
+            columns['price_benchmark_ratio_high_overall'] = calculate_price_benchmarks(df_nearby, median_sale_price, 'overall')
+
+            # Calculate price trends
+            for days in [30, 90, 180]:
+                trend = calculate_price_trend(df_nearby, days)
+                columns[f'price_trend_{days}_days'] = trend
+    else:
+        logging.warning("No combined nearby properties found for market trends and benchmarks.")
+    return columns
+
+def calculate_streaming_columns(latitude, longitude, radii):
+    """
+    The same columns as calculate_comparables_columns, aggregated chunk by chunk with bounded memory.
+    Medians are exact until a sketch holds more than a few thousand distinct values, then
+    within 0.5% (see QuantileSketch).
+    """
+    columns = {'comparables_search_radius_km': max(radii)}
+    aggregates = fetch_comparables_aggregates(latitude, longitude, radii)
+    now = datetime.now()
+    combined = ComparablesAggregate(now)
+    for radius in radii:
+        aggregate = aggregates[radius]
+        columns[f'nearby_properties_count_within_{radius}km'] = aggregate.rows
+        if aggregate.rows:
+            columns.update(calculate_aggregate_metrics(aggregate, radius))
+            # The rings overlap, so inner comparables are weighted once per radius they fall in
+            combined.merge(aggregate)
+        else:
+            logging.warning(f"No nearby properties found within {radius}km to calculate metrics.")
+
+    if combined.rows:
+        columns.update(calculate_aggregate_market_metrics(combined))
+    else:
+        logging.warning("No combined nearby properties found for market trends and benchmarks.")
+    return columns
+
 # ======================================
 # Step 3: Generate Derived Columns Function
 # ======================================
@@ -445,8 +710,8 @@ def generate_columns(original_inputs):
     try:
         logging.info("Starting generate_columns function.")
         
-        # Preprocess the property data
-        preprocessed_data = preprocess_property_data(original_inputs)
+        # Preprocess a copy of the property data so the caller's inputs stay untouched
+        preprocessed_data = preprocess_property_data(dict(original_inputs))
         
         # Derived features
         derived_features = {
@@ -467,52 +732,12 @@ def generate_columns(original_inputs):
         # Initialize energy_rating_numeric if needed
         result['energy_rating_numeric'] = ber_to_numeric(preprocessed_data.get('ber_rating', ''))
         
-        # Fetch and calculate metrics for each radius
+        # Nearby comparables metrics for the 1/3/5 km radii and the market columns
         radii = [1, 3, 5]
-        combined_nearby_props = []
-        for radius in radii:
-            nearby_props = fetch_nearby_properties(result['latitude'], result['longitude'], radius_km=radius)
-            result[f'nearby_properties_count_within_{radius}km'] = len(nearby_props)
-            if nearby_props:
-                nearby_metrics = calculate_nearby_metrics(nearby_props, radius)
-                result.update(nearby_metrics)
-                combined_nearby_props.extend(nearby_props)
-            else:
-                logging.warning(f"No nearby properties found within {radius}km to calculate metrics.")
-        
-        # Calculate market trends and benchmarks if combined_nearby_props is not empty
-        if combined_nearby_props:
-            df_nearby = pd.DataFrame(combined_nearby_props)
-            # Preprocess the DataFrame
-            df_nearby = df_nearby.apply(preprocess_property_data, axis=1)
-            df_nearby = df_nearby.dropna(subset=['sale_price', 'latitude', 'longitude'])
-            
-            # Calculate days on market and price per sqm
-            df_nearby['days_on_market'] = df_nearby.apply(
-                lambda row: calculate_days_on_market(row.get('first_list_date'), row.get('sale_date')), axis=1
-            )
-            df_nearby['price_per_square_meter'] = df_nearby.apply(
-                lambda row: safe_divide(row.get('sale_price'), row.get('myhome_floor_area_value')), axis=1
-            )
-            
-            # Calculate market trends
-            market_trend = calculate_market_trends(df_nearby)
-            result['market_trend_30_days'] = market_trend
-            
-            # Calculate price benchmarks
-            median_sale_price = df_nearby['sale_price'].median()
-            result['price_benchmark_ratio_low_high'] = calculate_price_benchmarks(df_nearby, 0, median_sale_price)
-            result['price_benchmark_ratio_high_overall'] = calculate_price_benchmarks(df_nearby, median_sale_price, 'overall')
-            
-            # Calculate price trends
-            for days in [30, 90, 180]:
-                trend = calculate_price_trend(df_nearby, days)
-                result[f'price_trend_{days}_days'] = trend
+        if COMPARABLES_SEARCH == 'streaming':
+            result.update(calculate_streaming_columns(result['latitude'], result['longitude'], radii))
         else:
-            logging.warning("No combined nearby properties found for market trends and benchmarks.")
-        
-        # Replace NaN with None
-        result = replace_nan(result)
+            result.update(calculate_comparables_columns(result['latitude'], result['longitude'], radii))
         
         logging.info("Finished generate_columns function.")
         return result
@@ -535,7 +760,7 @@ def python_api(request):
         
         if request_json and 'originalInputs' in request_json:
             result = generate_columns(request_json['originalInputs'])
-            return jsonify(result), 200
+            return json_response(result), 200
         else:
             logging.error("Invalid input: 'originalInputs' key missing.")
             return jsonify({"error": "Invalid input. 'originalInputs' key is missing."}), 400
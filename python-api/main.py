@@ -1,47 +1,31 @@
 import os
-import json
 import logging
 import traceback
-from flask import Flask, request, jsonify, Response, make_response
+from flask import Flask, request, jsonify, Response, g
 import functions_framework
 from generate_columns import generate_columns
-from predict import predict
-import numpy as np
+from predict import predict, predict_batch
+from serialization import json_response
+from singleflight import SingleFlight, normalize_key
+from timing import begin_request, end_request, server_timing_header
+from profiling import authorized, finish_profile, get_profile, list_profiles, start_profile
 
 app = Flask(__name__)
 
+# Concurrent identical requests (e.g. a shared listing being opened) share one computation
+inflight_requests = SingleFlight()
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, (dict, list)):
-            return json.dumps(obj)
-        return super(NumpyEncoder, self).default(obj)
-
-def is_json_serializable(value):
-    """Check if a value is JSON serializable."""
-    return isinstance(value, (str, int, float, bool, type(None)))
-
-def filter_json_serializable(data):
-    """Recursively filter out non-JSON-serializable values from a dictionary."""
-    if isinstance(data, dict):
-        return {k: filter_json_serializable(v) for k, v in data.items() if is_json_serializable(v) or isinstance(v, (dict, list))}
-    elif isinstance(data, list):
-        return [filter_json_serializable(item) for item in data if is_json_serializable(item) or isinstance(item, (dict, list))]
-    else:
-        return data
-
 # Determine API environment
 api_env = os.getenv('API_ENV', 'local')
 api_url = os.getenv('API_URL', 'http://localhost:8080')  # Default to local
 
+# Bound the work one /predict_batch request can do; exact explanations cost ~15-20 ms per row
+MAX_BATCH_ROWS = int(os.getenv('MAX_BATCH_ROWS', '1000'))
+MAX_EXACT_EXPLAIN_ROWS = int(os.getenv('MAX_EXACT_EXPLAIN_ROWS', '50'))
+
 if api_env == 'local':
     logging.info("Using local Flask API.")
     logging.info(f"API URL: {api_url}")
@@ -49,17 +33,90 @@ else:
     logging.info("Using Google Cloud API.")
     logging.info(f"API URL: {api_url}")
 
+@app.before_request
+def start_stage_timings():
+    begin_request()
+
+@app.before_request
+def start_request_profile():
+    g.profile = start_profile(request.headers, request.path)
+
+@app.after_request
+def add_server_timing(response):
+    """
+    Report the per-stage timings of the request (supabase_query, decode, metrics,
+    features, model, ...) in a Server-Timing header for load tests.
+    """
+    stages = end_request()
+    if stages:
+        response.headers['Server-Timing'] = server_timing_header(stages)
+    return response
+
+@app.after_request
+def finish_request_profile(response):
+    """
+    Store the profile of a profiled request; its id is returned in X-Profile-Id.
+    """
+    profile_id = finish_profile(g.pop('profile', None), response.status_code)
+    if profile_id is not None:
+        response.headers['X-Profile-Id'] = str(profile_id)
+    return response
+
+@app.teardown_request
+def discard_request_profile(exception=None):
+    """
+    Stop and store the profile of a request that failed before after_request ran.
+    """
+    finish_profile(g.pop('profile', None), 500)
+
 @functions_framework.http
 def python_api(request):
     with app.app_context():
-        if request.path == '/generate_columns':
-            return generate_columns_api(request)
-        elif request.path == '/predict':
-            return predict_api(request)
-        elif request.path == '/':
-            return health_check(request)
-        else:
-            return jsonify({"error": "Not Found"}), 404
+        begin_request()
+        g.profile = start_profile(request.headers, request.path)
+        try:
+            response = finish_request_profile(app.make_response(dispatch_request(request)))
+        finally:
+            discard_request_profile()
+        return add_server_timing(response)
+
+def dispatch_request(request):
+    """
+    Route a functions_framework request to the matching Flask view.
+    """
+    if request.path == '/generate_columns':
+        return generate_columns_api()
+    elif request.path == '/predict':
+        return predict_api()
+    elif request.path == '/predict_batch':
+        return predict_batch_api()
+    elif request.path == '/valuation':
+        return valuation_api()
+    elif request.path == '/stats':
+        return stats()
+    elif request.path == '/admin/profiles':
+        return profiles()
+    elif request.path.startswith('/admin/profiles/'):
+        return profile(request.path.rsplit('/', 1)[1])
+    elif request.path == '/':
+        return health_check()
+    else:
+        return jsonify({"error": "Not Found"}), 404
+
+def explain_args():
+    """
+    Read the optional explain and top_k query parameters of the prediction endpoints.
+    explain=true returns exact TreeSHAP contributions, explain=approx the cheaper approximation.
+    top_k is None unless it is a positive integer.
+    """
+    explain = {'true': True, 'approx': 'approx'}.get(request.args.get('explain', 'false').lower(), False)
+    try:
+        top_k = int(request.args.get('top_k', '5'))
+    except ValueError:
+        top_k = None
+    if top_k is not None and top_k < 1:
+        top_k = None
+    return explain, top_k
 
 @app.route('/generate_columns', methods=['POST'])
 def generate_columns_api():
@@ -67,18 +124,12 @@ def generate_columns_api():
         data = request.get_json()
         logging.info(f"Received data: {data}")
         
-        result = generate_columns(data)
+        result = inflight_requests.do(normalize_key('generate_columns', data), generate_columns, data)
         
         logging.info("Raw output from generate_columns:")
         logging.info(result)
         
-        # Ensure the result is JSON serializable
-        json_safe_result = json.loads(json.dumps(result, default=str))
-        
-        logging.info("JSON-safe result:")
-        logging.info(json_safe_result)
-        
-        return jsonify(json_safe_result), 200
+        return json_response(result)
 
     except Exception as e:
         logging.error(f"Error in generate_columns: {str(e)}")
@@ -89,18 +140,115 @@ def generate_columns_api():
 def predict_api():
     """
     API Endpoint to make predictions based on processed data.
+    With ?explain=true (or explain=approx) the top_k feature contributions are returned as well.
     """
     try:
         data = request.get_json()
         logging.info(f"Received data for predict: {data}")
-        result = predict(data)
+        explain, top_k = explain_args()
+        if top_k is None:
+            return jsonify({"error": "Invalid input. 'top_k' must be a positive integer."}), 400
+        result = predict(data, explain=explain, top_k=top_k)
         logging.debug(f"Prediction result: {result}")
-        return jsonify(result), 200
+        return json_response(result)
     except Exception as e:
         logging.error(f"Error in predict_api: {e}")
         logging.error(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch_api():
+    """
+    API Endpoint to predict a list of processed inputs, {"rows": [...]}, in one model call.
+    """
+    try:
+        data = request.get_json()
+        rows = data.get('rows') if isinstance(data, dict) else None
+        if not isinstance(rows, list) or not rows:
+            return jsonify({"error": "Invalid input. 'rows' must be a non-empty list."}), 400
+        if len(rows) > MAX_BATCH_ROWS:
+            return jsonify({"error": f"Invalid input. At most {MAX_BATCH_ROWS} rows per request."}), 400
+        logging.info(f"Received {len(rows)} rows for predict_batch")
+        explain, top_k = explain_args()
+        if top_k is None:
+            return jsonify({"error": "Invalid input. 'top_k' must be a positive integer."}), 400
+        if explain is True and len(rows) > MAX_EXACT_EXPLAIN_ROWS:
+            return jsonify({"error": f"Invalid input. explain=true is limited to {MAX_EXACT_EXPLAIN_ROWS} rows; "
+                                     "use explain=approx for larger batches."}), 400
+        result = predict_batch(rows, explain=explain, top_k=top_k)
+        if 'error' in result:
+            return jsonify(result), 500
+        return json_response(result)
+    except Exception as e:
+        logging.error(f"Error in predict_batch_api: {e}")
+        logging.error(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+def run_valuation(data, explain=False, top_k=5):
+    """
+    Generate the derived columns for the inputs and predict from them in memory.
+    """
+    columns = generate_columns(data)
+    result = predict({**columns, 'originalInputs': data}, return_features=True, explain=explain, top_k=top_k)
+    if 'error' not in result:
+        result['columns'] = columns
+    return result
+
+@app.route('/valuation', methods=['POST'])
+def valuation_api():
+    """
+    API Endpoint that generates the derived columns and predicts in a single call.
+
+    The generated columns are handed to the predictor in memory, so the client
+    no longer has to send the /generate_columns output back to /predict.
+    """
+    try:
+        data = request.get_json()
+        logging.info(f"Received data for valuation: {data}")
+
+        explain, top_k = explain_args()
+        if top_k is None:
+            return jsonify({"error": "Invalid input. 'top_k' must be a positive integer."}), 400
+        key = normalize_key('valuation', {'data': data, 'explain': explain, 'top_k': top_k})
+        result = inflight_requests.do(key, run_valuation, data, explain, top_k)
+        if 'error' in result:
+            return jsonify(result), 500
+
+        logging.debug(f"Valuation result: {result}")
+        return json_response(result)
+    except Exception as e:
+        logging.error(f"Error in valuation_api: {e}")
+        logging.error(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Request coalescing counters for this process.
+    """
+    return jsonify({"singleflight": inflight_requests.stats()}), 200
+
+@app.route('/admin/profiles', methods=['GET'])
+def profiles():
+    """
+    List the stored request profiles. Requires the X-Profile-Token header.
+    """
+    if not authorized(request.headers):
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"profiles": list_profiles()}), 200
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def profile(profile_id):
+    """
+    A stored request profile as collapsed stacks (one "frame;frame;frame value" line per
+    stack), ready for flamegraph.pl or speedscope. Requires the X-Profile-Token header.
+    """
+    if not authorized(request.headers):
+        return jsonify({"error": "Forbidden"}), 403
+    record = get_profile(profile_id)
+    if record is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response('\n'.join(record['stacks']) + '\n', mimetype='text/plain')
 
 @app.route('/', methods=['GET'])
 def health_check():
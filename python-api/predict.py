@@ -3,9 +3,13 @@ import json
 import logging
 import os
 import traceback
+from functools import lru_cache
 import joblib  # For loading the XGBoost model
 import xgboost as xgb
+import numpy as np
 import pandas as pd
+from categorical import CATEGORY_FEATURES
+from timing import stage
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
 
@@ -36,12 +40,38 @@ def load_model(model_path):
         logging.error(f"Failed to load or prepare the model: {e}")
         raise
 
+MODEL_PATH = os.path.join(os.path.dirname(__file__), 'xgboost_model.joblib')
+
+# Optional quantile models served alongside the main model. They are XGBoost regressors
+# trained on the output of the main model's preprocessor, so every model in the set is
+# evaluated on one transformed feature matrix. Missing files are skipped.
+INTERVAL_MODEL_PATHS = {
+    'lower': os.path.join(os.path.dirname(__file__), 'xgboost_model_lower.joblib'),
+    'upper': os.path.join(os.path.dirname(__file__), 'xgboost_model_upper.joblib'),
+}
+
+@lru_cache(maxsize=None)
+def get_model(model_path=MODEL_PATH):
+    """
+    Load a model once per process and reuse it for every request.
+    """
+    return load_model(model_path)
+
+def get_interval_models():
+    """
+    The interval (quantile) models whose files exist, keyed by bound name.
+    """
+    return {name: get_model(path) for name, path in INTERVAL_MODEL_PATHS.items() if os.path.exists(path)}
+
 def prepare_features(data):
+    return pd.DataFrame([prepare_feature_dict(data)])
+
+def prepare_feature_dict(data):
     try:
         features = {}
         
         # Log the received data
-        logging.debug(f"Data received for feature preparation: {json.dumps(data, indent=2)}")
+        logging.debug(f"Data received for feature preparation: {json.dumps(data, indent=2, default=str)}")
         
         # Basic features
         original_inputs = data.get('originalInputs', {})
@@ -53,10 +83,11 @@ def prepare_features(data):
             features[feature if feature != 'size' else 'myhome_floor_area_value'] = value
             logging.debug(f"Feature {feature}: {value}")
         
-        # Categorical features
-        categorical_features = ['bedCategory', 'bathCategory', 'propertyTypeCategory', 'berCategory', 'sizeCategory']
-        for feature in categorical_features:
-            value = data.get(feature, 'Unknown')
+        # Categorical features, derived from the original inputs with the shared encoders when not supplied
+        for feature, (input_key, encode, _, _) in CATEGORY_FEATURES.items():
+            value = data.get(feature)
+            if value is None:
+                value = encode(original_inputs.get(input_key))
             features[feature] = value
             logging.debug(f"Categorical Feature {feature}: {value}")
         
@@ -85,41 +116,165 @@ def prepare_features(data):
             features[ber_feature_name] = ber_value
             logging.debug(f"Feature {ber_feature_name}: {ber_value}")
         
-        df = pd.DataFrame([features])
+        logging.debug(f"Prepared features: {features}")
+        logging.info(f"Number of features prepared: {len(features)}")
         
-        logging.debug(f"Prepared feature DataFrame: {df}")
-        logging.info(f"Number of features prepared: {len(df.columns)}")
-        
-        return df
+        return features
     except Exception as e:
         logging.error(f"Error preparing features: {e}")
         raise
 
-def predict(data):
+def build_feature_frame(data, model):
+    """
+    Prepare the feature DataFrame for one input dict (or a list of them, one row each)
+    and align it with the columns the model was trained on.
+    """
+    rows = data if isinstance(data, list) else [data]
+    features_df = pd.DataFrame([prepare_feature_dict(row) for row in rows])
+
+    if hasattr(model, 'feature_names_in_'):
+        missing_features = set(model.feature_names_in_) - set(features_df.columns)
+        extra_features = set(features_df.columns) - set(model.feature_names_in_)
+
+        if missing_features:
+            logging.warning(f"Missing features: {missing_features}")
+        if extra_features:
+            logging.warning(f"Extra features that will be ignored: {extra_features}")
+
+        features_df = features_df.reindex(columns=model.feature_names_in_, fill_value=0)
+
+    return features_df
+
+def split_model(model):
+    """
+    Split a Pipeline into its preprocessing steps and the final XGBoost regressor.
+    """
+    if hasattr(model, 'steps'):
+        return model[:-1], model[-1]
+    return None, model
+
+@lru_cache(maxsize=8)
+def contribution_groups(model):
+    """
+    Map each column of the transformed matrix back to the model input feature it came from,
+    so one-hot columns are summed into their source feature.
+
+    Returns the input feature names and a (transformed columns x features) indicator matrix.
+    """
+    preprocessor, regressor = split_model(model)
+    if preprocessor is None:
+        names = list(getattr(model, 'feature_names_in_', range(regressor.n_features_in_)))
+        return names, np.eye(len(names))
+
+    column_transformer = preprocessor[-1] if hasattr(preprocessor, 'steps') else preprocessor
+    names = list(column_transformer.feature_names_in_)
+    groups = []
+    for _, transformer, columns in column_transformer.transformers_:
+        if transformer == 'drop' or len(columns) == 0:
+            continue
+        if isinstance(columns[0], (int, np.integer)):
+            columns = [names[i] for i in columns]
+        encoder = transformer[-1] if hasattr(transformer, 'steps') else transformer
+        if hasattr(encoder, 'categories_'):
+            for column, categories in zip(columns, encoder.categories_):
+                groups.extend([names.index(column)] * len(categories))
+        else:
+            groups.extend(names.index(column) for column in columns)
+
+    if len(groups) != regressor.n_features_in_:
+        raise ValueError(f"Could not map {regressor.n_features_in_} model columns back to input features")
+
+    indicator = np.zeros((len(groups), len(names)))
+    indicator[np.arange(len(groups)), groups] = 1.0
+    return names, indicator
+
+def explain_predictions(model, matrix, features_df, top_k=5, approximate=False):
+    """
+    Top-k feature contributions per row from XGBoost's native TreeSHAP (pred_contribs),
+    computed on the already transformed matrix and mapped back to the input feature names.
+
+    Exact TreeSHAP costs roughly trees x leaves x depth^2 per row; approximate=True uses
+    XGBoost's approx_contribs (Saabas attribution), which is about 100x cheaper.
+    """
+    _, regressor = split_model(model)
+    names, indicator = contribution_groups(model)
+
+    contribs = regressor.get_booster().predict(xgb.DMatrix(matrix), pred_contribs=True, approx_contribs=approximate)
+    base_values = contribs[:, -1]
+    per_feature = contribs[:, :-1] @ indicator
+
+    top_k = min(max(top_k, 1), len(names))
+    top = np.argsort(-np.abs(per_feature), axis=1, kind='stable')[:, :top_k]
+    values = features_df.reindex(columns=names).to_numpy(dtype=object)
+
+    explanations = []
+    for row, columns in enumerate(top):
+        explanations.append({
+            "base_value": float(base_values[row]),
+            "contributions": [
+                {"feature": names[i], "value": values[row, i], "contribution": float(per_feature[row, i])}
+                for i in columns
+            ],
+        })
+    return explanations
+
+def predict_frame(model, features_df, explain=False, top_k=5, interval_models=None):
+    """
+    Predict every row of an aligned feature DataFrame, optionally with explanations
+    (explain=True for exact TreeSHAP, explain='approx' for approximate contributions)
+    and an interval from the given interval models ({'lower': model, 'upper': model}).
+    The features are transformed once and the same matrix is used for all of them.
+    """
+    preprocessor, regressor = split_model(model)
+    matrix = preprocessor.transform(features_df) if preprocessor is not None else features_df
+
+    predictions = regressor.predict(matrix)
+    results = [{"prediction": float(prediction)} for prediction in predictions]
+    if interval_models:
+        bounds = {name: split_model(interval_model)[1].predict(matrix) for name, interval_model in interval_models.items()}
+        # Quantile models are fitted separately and can cross the point estimate; clip them to it
+        if 'lower' in bounds:
+            bounds['lower'] = np.minimum(bounds['lower'], predictions)
+        if 'upper' in bounds:
+            bounds['upper'] = np.maximum(bounds['upper'], predictions)
+        for row, result in enumerate(results):
+            result["interval"] = {name: float(values[row]) for name, values in bounds.items()}
+    if explain:
+        explanations = explain_predictions(model, matrix, features_df, top_k, approximate=explain == 'approx')
+        for result, explanation in zip(results, explanations):
+            result["explanation"] = explanation
+    return results
+
+def predict(data, return_features=False, explain=False, top_k=5):
     try:
-        model_path = os.path.join(os.path.dirname(__file__), 'xgboost_model.joblib')
-        model = load_model(model_path)
+        model = get_model()
 
-        features_df = prepare_features(data)
-        
-        if hasattr(model, 'feature_names_in_'):
-            missing_features = set(model.feature_names_in_) - set(features_df.columns)
-            extra_features = set(features_df.columns) - set(model.feature_names_in_)
-            
-            if missing_features:
-                logging.warning(f"Missing features: {missing_features}")
-            if extra_features:
-                logging.warning(f"Extra features that will be ignored: {extra_features}")
-
-            for feature in model.feature_names_in_:
-                if feature not in features_df.columns:
-                    features_df[feature] = 0
-            features_df = features_df[model.feature_names_in_]
-
-        predictions = model.predict(features_df)
-        prediction = float(predictions[0])
-        
-        return {"prediction": prediction}
+        with stage('features'):
+            features_df = build_feature_frame(data, model)
+
+        with stage('model'):
+            result = predict_frame(model, features_df, explain, top_k, get_interval_models())[0]
+        if return_features:
+            result["features"] = features_df.to_dict(orient='records')[0]
+        return result
+
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        logging.error(traceback.format_exc())
+        return {"error": str(e)}
+
+def predict_batch(rows, explain=False, top_k=5):
+    """
+    Predict a list of inputs (each shaped like the predict() input) in one model call.
+    """
+    try:
+        model = get_model()
+
+        with stage('features'):
+            features_df = build_feature_frame(rows, model)
+
+        with stage('model'):
+            return {"predictions": predict_frame(model, features_df, explain, top_k, get_interval_models())}
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
@@ -0,0 +1,268 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+# Opt-in per-request profiling. A request is profiled when it sends
+#   X-Profile: cpu|memory  and  X-Profile-Token: <PROFILING_TOKEN>
+# or when it is sampled at PROFILE_SAMPLE_RATE. With neither configured,
+# start_profile() returns None after two global lookups.
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN_HEADER = 'X-Profile-Token'
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SAMPLE_MODE = os.getenv('PROFILE_SAMPLE_MODE', 'cpu')
+PROFILE_BUFFER_SIZE = int(os.getenv('PROFILE_BUFFER_SIZE', '20'))
+# Profiles are stored as files so that any worker process can serve any worker's profile
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'python-api-profiles'))
+MODES = ('cpu', 'memory')
+
+TRACEMALLOC_FRAMES = 64
+MAX_STACK_DEPTH = 128
+# Call paths that account for less time than this are not expanded further
+MIN_STACK_SECONDS = 1e-5
+
+# Profile ids are uuid4 hex strings, which also keeps them safe to use as file names
+PROFILE_ID = re.compile(r'[0-9a-f]{32}')
+
+# cProfile and tracemalloc are not safe to run for overlapping requests, so only one
+# request is profiled at a time; others arriving meanwhile are simply not profiled
+_active = threading.Lock()
+
+def authorized(headers):
+    """
+    Whether the request carries the profiling token. Always False when no token is configured.
+    """
+    token = headers.get(PROFILE_TOKEN_HEADER)
+    return bool(PROFILING_TOKEN) and token is not None and hmac.compare_digest(token, PROFILING_TOKEN)
+
+def requested_mode(headers):
+    """
+    The profiling mode for a request ('cpu' or 'memory'), or None if it should not be profiled.
+    """
+    mode = headers.get(PROFILE_HEADER)
+    if mode in MODES and authorized(headers):
+        return mode
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_SAMPLE_MODE
+    return None
+
+def format_function(function):
+    filename, line, name = function
+    if filename == '~':
+        # Built-ins, e.g. "<built-in method numpy.core._multiarray_umath.implement_array_function>"
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+def collapse_cprofile(profile):
+    """
+    Convert cProfile results into collapsed stacks ("root;caller;callee microseconds").
+
+    cProfile only records caller -> callee edges, so the call tree is rebuilt from the
+    roots and each function's time is split between its callers in proportion to the
+    cumulative time each caller spent in it.
+    """
+    stats = pstats.Stats(profile).stats
+    children = {}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            children.setdefault(caller, {})[function] = cumulative
+
+    collapsed = {}
+
+    def walk(function, stack, budget):
+        _, _, own, cumulative, _ = stats[function]
+        if budget < MIN_STACK_SECONDS or cumulative <= 0:
+            return
+        share = min(budget / cumulative, 1.0)
+        stack = stack + [format_function(function)]
+        key = ';'.join(stack)
+        collapsed[key] = collapsed.get(key, 0.0) + own * share
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for child, child_cumulative in children.get(function, {}).items():
+            # Recursive calls are already counted in the frame higher up the stack
+            if format_function(child) not in stack:
+                walk(child, stack, child_cumulative * share)
+
+    for function, (_, _, _, cumulative, callers) in stats.items():
+        if not callers:
+            walk(function, [], cumulative)
+
+    return [f'{stack} {round(seconds * 1e6)}' for stack, seconds in collapsed.items() if round(seconds * 1e6) > 0]
+
+def collapse_tracemalloc(snapshot):
+    """
+    Convert a tracemalloc snapshot into collapsed stacks ("root;caller;allocator bytes")
+    of the memory still allocated when the snapshot was taken.
+    """
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+    lines = []
+    for statistic in snapshot.statistics('traceback'):
+        # Frames are ordered oldest to most recent
+        stack = ';'.join(f'{os.path.basename(frame.filename)}:{frame.lineno}' for frame in statistic.traceback)
+        lines.append(f'{stack} {statistic.size}')
+    return lines
+
+class RequestProfile:
+    """
+    A cProfile ('cpu') or tracemalloc ('memory') capture spanning one request.
+
+    cProfile follows only the thread handling the request. tracemalloc is process-wide,
+    so a memory profile also includes allocations made by concurrent requests.
+    """
+
+    def __init__(self, mode, path):
+        self.mode = mode
+        self.path = path
+        self.profiler = None
+        self.started_tracemalloc = False
+
+    def start(self):
+        self.start_time = time.time()
+        self.start_counter = time.perf_counter()
+        if self.mode == 'cpu':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self.started_tracemalloc = True
+            tracemalloc.reset_peak()
+
+    def stop(self, status):
+        """
+        Stop profiling and return the profile record to store.
+        """
+        duration = time.perf_counter() - self.start_counter
+        record = {
+            'mode': self.mode,
+            'path': self.path,
+            'status': status,
+            'started_at': self.start_time,
+            'duration_ms': round(duration * 1e3, 2),
+        }
+        if self.mode == 'cpu':
+            self.profiler.disable()
+            record['unit'] = 'microseconds'
+            record['stacks'] = collapse_cprofile(self.profiler)
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            if self.started_tracemalloc:
+                tracemalloc.stop()
+            record['unit'] = 'bytes'
+            record['stacks'] = collapse_tracemalloc(snapshot)
+        return record
+
+def start_profile(headers, path):
+    """
+    Start profiling the current request if it asked for it or was sampled.
+    Returns the running RequestProfile, or None.
+    """
+    if not PROFILING_TOKEN and PROFILE_SAMPLE_RATE <= 0:
+        return None
+    mode = requested_mode(headers)
+    if mode is None or not _active.acquire(blocking=False):
+        return None
+    try:
+        profile = RequestProfile(mode, path)
+        profile.start()
+        return profile
+    except Exception as e:
+        # e.g. another profiler or debugger already attached; never fail the request over it
+        logging.warning(f"Could not start {mode} profile for {path}: {e}")
+        _active.release()
+        return None
+
+def _stored_paths():
+    """
+    Paths of the stored profiles, most recent first.
+    """
+    try:
+        names = [name for name in os.listdir(PROFILE_DIR) if name.endswith('.json')]
+    except FileNotFoundError:
+        return []
+    stats = []
+    for name in names:
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            stats.append((os.stat(path).st_mtime_ns, path))
+        except FileNotFoundError:
+            # Dropped by another worker meanwhile
+            continue
+    return [path for _, path in sorted(stats, reverse=True)]
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def store_profile(record):
+    """
+    Write a profile record to PROFILE_DIR and drop the oldest beyond PROFILE_BUFFER_SIZE.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{record['id']}.json")
+    # Write then rename, so other workers never read a partial file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(record, f)
+    os.replace(temporary, path)
+    for stale in _stored_paths()[PROFILE_BUFFER_SIZE:]:
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+
+def finish_profile(profile, status):
+    """
+    Stop a profile started by start_profile() and store it. Returns its id, or None.
+    """
+    if profile is None:
+        return None
+    try:
+        record = profile.stop(status)
+    except Exception as e:
+        # e.g. collapsing the stacks failed; the response is already built, so only lose the profile
+        logging.warning(f"Could not finish {profile.mode} profile for {profile.path}: {e}")
+        return None
+    finally:
+        _active.release()
+    # Random ids, so profiles from different worker processes never collide
+    record['id'] = uuid.uuid4().hex
+    try:
+        store_profile(record)
+    except OSError as e:
+        logging.warning(f"Could not store {profile.mode} profile for {profile.path}: {e}")
+        return None
+    return record['id']
+
+def list_profiles():
+    """
+    Summaries of the stored profiles of every worker, most recent first.
+    """
+    records = filter(None, (_read(path) for path in _stored_paths()))
+    return [{key: value for key, value in record.items() if key != 'stacks'} for record in records]
+
+def get_profile(profile_id):
+    """
+    The stored profile with this id, or None if it was never taken or has been dropped.
+    """
+    if not PROFILE_ID.fullmatch(profile_id):
+        return None
+    return _read(os.path.join(PROFILE_DIR, f'{profile_id}.json'))
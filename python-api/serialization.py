@@ -0,0 +1,68 @@
+import json
+import math
+from datetime import date, datetime
+from flask import Response
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+def _default(obj):
+    """
+    Convert values the JSON encoders do not handle natively.
+    """
+    if obj is pd.NaT or obj is None:
+        return None
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        value = float(obj)
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return _to_native(obj.tolist())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return _to_native(obj.tolist())
+    if isinstance(obj, (set, tuple)):
+        return _to_native(list(obj))
+    return str(obj)
+
+def _to_native(obj):
+    """
+    Recursively convert a payload into JSON-native types, replacing NaN/inf with None.
+    Only used when orjson is not installed.
+    """
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else float(obj)
+    if isinstance(obj, (str, bool, int)) or obj is None:
+        return obj
+    if isinstance(obj, dict):
+        return {k if isinstance(k, str) else str(_to_native(k)): _to_native(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_to_native(item) for item in obj]
+    return _default(obj)
+
+def dumps(obj):
+    """
+    Serialize a response payload to JSON bytes in a single pass.
+
+    Handles NumPy scalars and arrays, NaN/inf (written as null), pandas timestamps
+    and NaT, and nested dicts/lists.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(_to_native(obj), separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+def json_response(obj, status=200):
+    """
+    Build a Flask JSON response for a payload produced by generate_columns or predict.
+    """
+    return Response(dumps(obj), status=status, mimetype='application/json')
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+import threading
+from timing import stage
+
+def normalize_key(name, payload, precision=6):
+    """
+    Build a coalescing key for a request payload.
+
+    Numbers are rounded to `precision` decimals (1e-6 degrees is about 0.1 m) and
+    strings are stripped; key order does not matter. Strings are not lowercased
+    or parsed because generate_columns/predict treat e.g. 'B1' and 'b1' differently.
+    """
+    def normalize(value):
+        if isinstance(value, bool) or value is None:
+            return value
+        if isinstance(value, (int, float)):
+            return round(float(value), precision)
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return {str(k): normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return str(value)
+
+    return name + ':' + json.dumps(normalize(payload), sort_keys=True)
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls with the same key.
+
+    The first caller for a key runs the function; callers that arrive while it is
+    in flight wait for it and receive the same result (or exception). Nothing is
+    cached once the call completes. do() is for threaded servers (e.g. gunicorn
+    gthread workers), do_async() for asyncio servers; both update the same counters.
+    The result object is shared between callers and must not be mutated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self._counters = {'executed': 0, 'coalesced': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'in_flight': len(self._calls) + len(self._tasks)}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters['executed'] += 1
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            logging.info(f"Coalesced request onto in-flight call: {key}")
+            with stage('coalesced_wait'):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            # Includes SystemExit/KeyboardInterrupt (e.g. a worker timeout), so followers
+            # never mistake an unfinished call for a None result
+            call.error = e
+            self._count('errors')
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """
+        Asyncio variant of do(). fn may be a coroutine function or a blocking function,
+        which is run in the event loop's default executor.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            leader = task is None
+            if leader:
+                if asyncio.iscoroutinefunction(fn):
+                    task = loop.create_task(fn(*args, **kwargs))
+                else:
+                    task = asyncio.ensure_future(loop.run_in_executor(None, lambda: fn(*args, **kwargs)))
+                self._tasks[task_key] = task
+                self._counters['executed'] += 1
+                task.add_done_callback(lambda _: self._finish_task(task_key))
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            logging.info(f"Coalesced request onto in-flight call: {key}")
+        # Shield so a cancelled caller does not cancel the shared call for the others
+        return await asyncio.shield(task)
+
+    def _finish_task(self, task_key):
+        with self._lock:
+            task = self._tasks.pop(task_key)
+            if not task.cancelled() and task.exception() is not None:
+                self._counters['errors'] += 1
@@ -1,4 +1,5 @@
 import json
+from contextlib import contextmanager
 from generate_columns import generate_columns
 from predict import predict
 import pandas as pd
@@ -86,6 +87,543 @@ def test_predict():
 
     return output
 
+def test_valuation():
+    print("\nTesting valuation endpoint:")
+    from main import app
+
+    original_inputs = {
+        "beds": "4",
+        "baths": "4",
+        "size": "175",
+        "latitude": "53.3498",
+        "longitude": "-6.2603",
+        "property_type": "House",
+        "ber_rating": "B1"
+    }
+
+    response = app.test_client().post('/valuation', json=original_inputs)
+    result = response.get_json()
+    print(json.dumps(result, indent=2))
+
+    assert response.status_code == 200, "Valuation should succeed"
+    assert isinstance(result['prediction'], float), "Result should contain a float 'prediction'"
+    assert result['columns']['bedCategory'] == '4+ Bed', "Result should contain the generated columns"
+    assert 'nearby_properties_count_within_1km' in result['features'], "Result should contain the model features"
+
+    # The fused endpoint must agree with the two-step generate_columns -> predict flow
+    columns = generate_columns(original_inputs)
+    two_step = predict({**json.loads(json.dumps(columns, default=str)), 'originalInputs': original_inputs})
+    assert result['prediction'] == two_step['prediction'], "Fused and two-step predictions should match"
+
+    print("All basic assertions for valuation passed.")
+
+def test_serialization():
+    print("\nTesting response serialization:")
+    import numpy as np
+    from serialization import dumps
+
+    payload = {
+        "count": np.int64(3),
+        "median": np.float64(250000.5),
+        "missing": float('nan'),
+        "np_missing": np.float64('nan'),
+        "flag": np.bool_(True),
+        "sold": pd.Timestamp("2024-05-01"),
+        "not_sold": pd.NaT,
+        "nested": {"values": np.array([1.5, np.nan]), "items": [np.int8(1), None]},
+    }
+
+    result = json.loads(dumps(payload))
+    print(json.dumps(result, indent=2))
+
+    assert result == {
+        "count": 3,
+        "median": 250000.5,
+        "missing": None,
+        "np_missing": None,
+        "flag": True,
+        "sold": "2024-05-01T00:00:00",
+        "not_sold": None,
+        "nested": {"values": [1.5, None], "items": [1, None]},
+    }, "Payload should serialize to JSON-native values"
+
+    print("All basic assertions for serialization passed.")
+
+def test_comparables():
+    print("\nTesting columnar comparables:")
+    import numpy as np
+    from comparables import Comparables
+    from generate_columns import calculate_distance, calculate_nearby_metrics
+    from benchmarks.synthetic import make_properties
+
+    records = make_properties(2000, 53.29, -6.2)
+    comparables = Comparables.from_records(records, 53.29, -6.2, radius_km=5)
+
+    def within(radius):
+        return [p for p in records if calculate_distance(53.29, -6.2, p['latitude'], p['longitude']) <= radius]
+
+    for radius in [1, 3, 5]:
+        nearby = comparables.within(radius)
+        assert len(nearby) == len(within(radius)), f"Comparables within {radius}km should match the row-by-row filter"
+        assert np.shares_memory(nearby['sale_price'], comparables['sale_price']), "within() should not copy"
+
+    metrics = calculate_nearby_metrics(comparables.within(3), 3)
+    assert metrics == calculate_nearby_metrics(within(3), 3), "Container and list inputs should give the same metrics"
+
+    sold = pd.DataFrame([p for p in within(3) if p['sale_price'] is not None])
+    assert metrics['3km_median_beds'] == sold['beds'].str.extract(r'(\d+)', expand=False).astype(float).median()
+    assert metrics['180d_3km_num_properties_sold'] <= len(sold), "Sold counts should be bounded by sold rows"
+    assert comparables['ber_category'].dtype == np.int8, "BER categories should be int8 coded"
+
+    # Against the previous pandas path on the same rows. Counts can only differ by the rows the
+    # old per-radius bounding box clipped at the edge of the circle; the metrics must agree.
+    from benchmarks.bench_comparables import legacy_nearby_metrics, legacy_nearby_properties
+    for radius in [1, 3, 5]:
+        legacy = legacy_nearby_properties(records, 53.29, -6.2, radius)
+        clipped = [p for p in within(radius) if not any(p is q for q in legacy)]
+        assert len(comparables.within(radius)) == len(legacy) + len(clipped)
+        assert all(abs(p['latitude'] - 53.29) > 0.99 * radius / 111.32 or abs(p['longitude'] + 6.2) > 0.99 * radius / (111.32 * np.cos(np.radians(53.29)))
+                   for p in clipped), "Only rows at the edge of the old bounding box should differ"
+
+        expected = legacy_nearby_metrics(legacy, radius)
+        actual = calculate_nearby_metrics(legacy, radius)
+        assert set(actual) == set(expected), f"Metric keys within {radius}km should match the pandas path"
+        for key, value in expected.items():
+            if pd.isna(value):
+                assert pd.isna(actual[key]), key
+            else:
+                assert np.isclose(actual[key], value, rtol=1e-12), f"{key}: {actual[key]} != {value}"
+
+    print("All basic assertions for comparables passed.")
+
+def test_categorical_encoders():
+    print("\nTesting categorical encoders:")
+    import numpy as np
+    from categorical import CATEGORY_FEATURES, decode, encode_ber_numeric
+    from generate_columns import ber_to_numeric, get_ber_category, get_property_type_category
+
+    assert get_ber_category(' b2 ') == 'B' and get_ber_category('SI_666') == 'Unknown' and get_ber_category(None) == 'Unknown'
+    assert get_property_type_category('Semi-D') == 'House' and get_property_type_category('Site') == 'Other'
+    assert ber_to_numeric('A1') == 19.0 and np.isnan(ber_to_numeric('--')) and np.isnan(ber_to_numeric('b2'))
+
+    values = [None, np.nan, '', '3', 3, 3.7, '3 Bed', 0, 1, '2', 4, 9, '120', 45.5, 'Flat', 'semi-detached',
+              'Studio', 'Site', ' a2 ', 'B', 'C3', 'D', 'E2', 'F', 'G', '--', 'SI_666', 150, '99.9', 'abc']
+    for feature, (_, encode, encode_values, categories) in CATEGORY_FEATURES.items():
+        codes = encode_values(values)
+        assert codes.dtype == np.int8, f"{feature} codes should be int8"
+        assert list(decode(codes, categories)) == [encode(value) for value in values], \
+            f"Vectorized {feature} encoder should match the scalar encoder"
+
+    numeric = encode_ber_numeric(values)
+    assert np.array_equal(numeric, [ber_to_numeric(value) for value in values], equal_nan=True)
+
+    print("All basic assertions for categorical encoders passed.")
+
+def test_singleflight():
+    print("\nTesting request coalescing:")
+    import asyncio
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from singleflight import SingleFlight, normalize_key
+
+    assert normalize_key('valuation', {"latitude": 53.29063559999999, "beds": 4}) == \
+        normalize_key('valuation', {"beds": 4.0, "latitude": 53.2906356}), "Keys should ignore order and float noise"
+    assert normalize_key('valuation', {"ber_rating": "B1"}) != normalize_key('valuation', {"ber_rating": "b1"})
+
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow_valuation(data):
+        calls.append(data)
+        started.set()
+        time.sleep(0.2)
+        return {"prediction": 500000.0}
+
+    key = normalize_key('valuation', {"beds": 3})
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        leader = executor.submit(flight.do, key, slow_valuation, {"beds": 3})
+        started.wait()
+        followers = [executor.submit(flight.do, key, slow_valuation, {"beds": 3}) for _ in range(7)]
+        results = [leader.result()] + [future.result() for future in followers]
+
+    assert len(calls) == 1, "Concurrent identical calls should run once"
+    assert all(result is results[0] for result in results), "Coalesced callers should share the result"
+    assert flight.stats() == {'executed': 1, 'coalesced': 7, 'errors': 0, 'in_flight': 0}
+
+    async def run_async():
+        async def slow_async(data):
+            calls.append(data)
+            await asyncio.sleep(0.05)
+            return {"prediction": 400000.0}
+        return await asyncio.gather(*[flight.do_async(key, slow_async, {"beds": 3}) for _ in range(5)])
+
+    results = asyncio.run(run_async())
+    assert len(calls) == 2 and all(result == {"prediction": 400000.0} for result in results)
+    assert flight.stats() == {'executed': 2, 'coalesced': 11, 'errors': 0, 'in_flight': 0}
+
+    # A leader killed by a BaseException (e.g. SystemExit on a worker timeout) fails its followers too
+    started.clear()
+
+    def timed_out(data):
+        started.set()
+        time.sleep(0.2)
+        raise SystemExit(1)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flight.do, key, timed_out, {"beds": 3})
+        started.wait()
+        follower = executor.submit(flight.do, key, timed_out, {"beds": 3})
+        for future in [leader, follower]:
+            try:
+                future.result()
+                assert False, "Followers should not receive a result when the leader exited"
+            except SystemExit:
+                pass
+    assert flight.stats()['errors'] == 1
+
+    print("All basic assertions for request coalescing passed.")
+
+def test_explain():
+    print("\nTesting prediction explanations:")
+    from predict import predict_batch
+
+    rows = [{"originalInputs": {"beds": beds, "baths": "2", "size": size, "latitude": "53.3498",
+                                "longitude": "-6.2603", "property_type": "House", "ber_rating": "B1"},
+             "nearby_properties_count_within_1km": 120}
+            for beds, size in [("2", "70"), ("3", "110"), ("5", "220")]]
+
+    plain = predict_batch(rows)
+    result = predict_batch(rows, explain=True, top_k=1000)
+    print(json.dumps(result["predictions"][0]["explanation"]["contributions"][:5], indent=2, default=str))
+
+    assert [p["prediction"] for p in result["predictions"]] == [p["prediction"] for p in plain["predictions"]], \
+        "Explaining should not change the predictions"
+    for prediction in result["predictions"]:
+        explanation = prediction["explanation"]
+        total = explanation["base_value"] + sum(c["contribution"] for c in explanation["contributions"])
+        assert abs(total - prediction["prediction"]) < 1.0, "Contributions should add up to the prediction"
+        magnitudes = [abs(c["contribution"]) for c in explanation["contributions"]]
+        assert magnitudes == sorted(magnitudes, reverse=True), "Contributions should be ordered by magnitude"
+
+    approx = predict_batch(rows, explain='approx', top_k=3)
+    assert all(len(p["explanation"]["contributions"]) == 3 for p in approx["predictions"])
+    clamped = predict_batch(rows, explain='approx', top_k=-1)
+    assert all(len(p["explanation"]["contributions"]) == 1 for p in clamped["predictions"]), "top_k should be at least 1"
+
+    # The endpoint rejects invalid top_k, oversized batches and large exact explanations
+    import main
+    client = main.app.test_client()
+    for top_k in ['0', '-1', 'abc', '2.5']:
+        assert client.post(f'/predict_batch?explain=approx&top_k={top_k}', json={"rows": rows}).status_code == 400, top_k
+    assert client.post('/predict?explain=approx&top_k=abc', json=rows[0]).status_code == 400
+    assert client.post('/predict_batch', json={"rows": rows * (main.MAX_BATCH_ROWS // len(rows) + 1)}).status_code == 400
+    large = rows * (main.MAX_EXACT_EXPLAIN_ROWS // len(rows) + 1)
+    assert client.post('/predict_batch?explain=true', json={"rows": large}).status_code == 400
+    assert client.post('/predict_batch?explain=approx', json={"rows": large}).status_code == 200
+
+    print("All basic assertions for prediction explanations passed.")
+
+def test_interval():
+    print("\nTesting prediction intervals:")
+    import os
+    import tempfile
+    import joblib
+    import predict as predict_module
+    from benchmarks.bench_interval import fit_interval_models
+    from benchmarks.synthetic import make_prediction_rows
+
+    model = predict_module.get_model()
+    interval_models = fit_interval_models(model, make_prediction_rows(300, seed=1), n_estimators=20, max_depth=3)
+    rows = make_prediction_rows(5)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {name: os.path.join(directory, f'xgboost_model_{name}.joblib') for name in interval_models}
+        for name, interval_model in interval_models.items():
+            joblib.dump(interval_model, paths[name])
+
+        original_paths = predict_module.INTERVAL_MODEL_PATHS
+        predict_module.INTERVAL_MODEL_PATHS = paths
+        try:
+            result = predict_module.predict_batch(rows)
+            single = predict_module.predict(rows[0])
+        finally:
+            predict_module.INTERVAL_MODEL_PATHS = original_paths
+
+    print(json.dumps(single, indent=2))
+
+    plain = predict_module.predict_batch(rows)
+    assert 'interval' not in plain["predictions"][0], "No interval without interval models"
+    for prediction, expected in zip(result["predictions"], plain["predictions"]):
+        assert prediction["prediction"] == expected["prediction"], "Interval models should not change the prediction"
+        assert prediction["interval"]["lower"] <= prediction["prediction"] <= prediction["interval"]["upper"]
+    assert single["interval"] == result["predictions"][0]["interval"], "Single and batch intervals should agree"
+
+    print("All basic assertions for prediction intervals passed.")
+
+@contextmanager
+def local_supabase(properties, search=None, max_rows=None):
+    """
+    Serve the properties from the local Supabase stand-in (capping responses at max_rows,
+    if given) and point generate_columns at it and at the given comparables search, if any.
+    Restores both when the block exits.
+    """
+    from supabase import create_client
+    import generate_columns as generate_columns_module
+    from benchmarks.fake_supabase import ANON_KEY, start_server
+
+    server = start_server(properties, max_rows=max_rows)
+    original = (generate_columns_module.supabase, generate_columns_module.COMPARABLES_SEARCH)
+    generate_columns_module.supabase = create_client(f'http://127.0.0.1:{server.server_port}', ANON_KEY)
+    if search is not None:
+        generate_columns_module.COMPARABLES_SEARCH = search
+    try:
+        yield generate_columns_module
+    finally:
+        generate_columns_module.supabase, generate_columns_module.COMPARABLES_SEARCH = original
+        server.shutdown()
+
+def test_load_harness():
+    print("\nTesting local Supabase stand-in and Server-Timing:")
+    from benchmarks.synthetic import make_properties
+    from main import app
+    from timing import parse_server_timing
+
+    with local_supabase(make_properties(2000, 53.3498, -6.2603, spread_km=5.0)):
+        original_inputs = {"beds": "3", "baths": "2", "size": "110", "latitude": "53.3498",
+                           "longitude": "-6.2603", "property_type": "House", "ber_rating": "B2"}
+        columns = generate_columns(original_inputs)
+        response = app.test_client().post('/valuation', json=original_inputs)
+
+    stages = parse_server_timing(response.headers.get('Server-Timing'))
+    print(json.dumps(stages, indent=2))
+
+    assert columns['nearby_properties_count_within_1km'] > 0, "The stand-in should serve nearby properties"
+    assert columns['nearby_properties_count_within_5km'] >= columns['nearby_properties_count_within_1km']
+    assert response.status_code == 200, "Valuation should succeed against the stand-in"
+    assert {'supabase_query', 'decode', 'metrics', 'features', 'model'} <= set(stages), \
+        "Server-Timing should report every valuation stage"
+
+    print("All basic assertions for the load-test harness passed.")
+
+def test_adaptive_radius():
+    print("\nTesting adaptive comparables search:")
+    import generate_columns as generate_columns_module
+    from benchmarks.synthetic import make_properties
+
+    queries = []
+    original_query = generate_columns_module.query_bounding_box
+
+    def counting_query(latitude, longitude, radius_km, **kwargs):
+        queries.append((radius_km, kwargs.get('columns', '*')))
+        return original_query(latitude, longitude, radius_km, **kwargs)
+
+    def run(properties, search, max_rows=None):
+        queries.clear()
+        generate_columns_module.query_bounding_box = counting_query
+        try:
+            with local_supabase(properties, search, max_rows):
+                return generate_columns({"beds": "3", "baths": "2", "size": "110", "latitude": "53.3498",
+                                         "longitude": "-6.2603", "property_type": "House", "ber_rating": "B2"}), list(queries)
+        finally:
+            generate_columns_module.query_bounding_box = original_query
+
+    def counts(result):
+        return [result[f'nearby_properties_count_within_{radius}km'] for radius in [1, 3, 5]]
+
+    # Dense: plenty of recent sales inside 1 km, so the search stops there and the counts
+    # come from a paged coordinates-only query of the largest radius. Responses are capped
+    # at Supabase's default max-rows, which the full 5 km box exceeds.
+    dense = make_properties(20000, 53.3498, -6.2603, spread_km=5.0)
+    result, queries_made = run(dense, 'adaptive', max_rows=1000)
+    fixed, _ = run(dense, 'fixed')
+    print(json.dumps({"queries": queries_made[:3], "search_radius": result['comparables_search_radius_km'],
+                      "counts": counts(result)}))
+    assert queries_made[0] == (1, '*') and result['comparables_search_radius_km'] == 1, "Dense areas should stop at the first radius"
+    assert set(queries_made[1:]) == {(5, 'id,latitude,longitude')} and len(queries_made) > 2, \
+        "The counts should page through the coordinates of the largest radius"
+    assert counts(result) == counts(fixed), "The counts the model sees should match the fixed search"
+    for radius in [1, 3, 5]:
+        assert f'{radius}km_avg_property_size' in result, "Every fixed radius should still be filled"
+
+    # A 1 km response filled to PostgREST's max-rows is truncated, not complete
+    original_max_rows = generate_columns_module.POSTGREST_MAX_ROWS
+    generate_columns_module.POSTGREST_MAX_ROWS = 300
+    try:
+        capped, _ = run(dense, 'adaptive', max_rows=300)
+    finally:
+        generate_columns_module.POSTGREST_MAX_ROWS = original_max_rows
+    assert counts(capped) == counts(fixed), "Counts should not come from a truncated response"
+
+    # Without the count query, counts that would be short are missing rather than wrong
+    original_count = generate_columns_module.count_comparables
+    generate_columns_module.count_comparables = lambda latitude, longitude, radii: None
+    try:
+        uncounted, _ = run(dense, 'adaptive')
+    finally:
+        generate_columns_module.count_comparables = original_count
+    assert counts(uncounted)[1:] == [None, None], "Counts beyond the searched radius should be missing"
+
+    # Sparse: an empty inner box jumps straight to the largest radius, matching the fixed search
+    sparse = [row for row in make_properties(60, 53.3498, -6.2603, spread_km=5.0)
+              if abs(row['latitude'] - 53.3498) > 0.01 or abs(row['longitude'] + 6.2603) > 0.016]
+    adaptive, queries_made = run(sparse, 'adaptive')
+    fixed, _ = run(sparse, 'fixed')
+    print(json.dumps({"queries": queries_made, "search_radius": adaptive['comparables_search_radius_km']}))
+    assert queries_made == [(1, '*'), (5, '*')], "Sparse areas should skip radii that cannot reach the target"
+    assert adaptive == fixed, "A search that reaches the largest radius should match the fixed search"
+
+    print("All basic assertions for adaptive comparables search passed.")
+
+def test_profiling():
+    print("\nTesting request profiling:")
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    import profiling
+    from flask import request
+    from main import app, python_api
+
+    original_inputs = {"beds": "3", "baths": "2", "size": "110", "latitude": "53.3498",
+                       "longitude": "-6.2603", "property_type": "House", "ber_rating": "B2"}
+    client = app.test_client()
+
+    response = client.post('/valuation', json=original_inputs, headers={'X-Profile': 'cpu'})
+    assert 'X-Profile-Id' not in response.headers, "Profiling should be off without a configured token"
+
+    original = (profiling.PROFILING_TOKEN, profiling.PROFILE_DIR, profiling.PROFILE_BUFFER_SIZE)
+    profiling.PROFILING_TOKEN = 'local-profiling-token'
+    profiling.PROFILE_DIR = tempfile.mkdtemp()
+    token = {'X-Profile-Token': 'local-profiling-token'}
+    try:
+        response = client.post('/valuation', json=original_inputs, headers={'X-Profile': 'cpu', **token})
+        cpu_id = response.headers['X-Profile-Id']
+        assert client.post('/valuation', json=original_inputs, headers={'X-Profile': 'cpu'}).headers.get('X-Profile-Id') is None, \
+            "Profiling should require the token"
+
+        # The functions_framework entry point is profiled the same way
+        with app.test_request_context('/valuation', method='POST', json=original_inputs,
+                                      headers={'X-Profile': 'memory', **token}):
+            memory_id = python_api(request).headers['X-Profile-Id']
+
+        assert client.get(f'/admin/profiles/{cpu_id}').status_code == 403, "The admin endpoint should require the token"
+        summaries = client.get('/admin/profiles', headers=token).get_json()['profiles']
+        stacks = client.get(f'/admin/profiles/{cpu_id}', headers=token).get_data(as_text=True).splitlines()
+        memory_stacks = client.get(f'/admin/profiles/{memory_id}', headers=token).get_data(as_text=True).splitlines()
+
+        # Profiles stored by another worker process are served too; ids never collide
+        worker = subprocess.run(
+            [sys.executable, '-c', "import profiling, uuid; record = {'id': uuid.uuid4().hex, 'mode': 'cpu', 'stacks': ['main 7']}; "
+                                   "profiling.store_profile(record); print(record['id'])"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, 'PROFILE_DIR': profiling.PROFILE_DIR},
+            capture_output=True, text=True, check=True)
+        worker_id = worker.stdout.strip()
+        assert len({cpu_id, memory_id, worker_id}) == 3
+        assert client.get(f'/admin/profiles/{worker_id}', headers=token).get_data(as_text=True) == 'main 7\n'
+        assert client.get('/admin/profiles/..%2Fprofiles', headers=token).status_code == 404
+
+        # Only the most recent PROFILE_BUFFER_SIZE profiles are kept
+        profiling.PROFILE_BUFFER_SIZE = 2
+        profiling.store_profile({'id': 'f' * 32, 'mode': 'cpu', 'stacks': []})
+        assert sorted(os.listdir(profiling.PROFILE_DIR)) == sorted([f'{worker_id}.json', 'f' * 32 + '.json'])
+
+        # A profile that fails to stop is dropped; the request still succeeds
+        original_collapse = profiling.collapse_cprofile
+        profiling.collapse_cprofile = lambda profile: 1 / 0
+        try:
+            response = client.post('/valuation', json=original_inputs, headers={'X-Profile': 'cpu', **token})
+        finally:
+            profiling.collapse_cprofile = original_collapse
+        assert response.status_code == 200 and 'X-Profile-Id' not in response.headers
+        assert client.post('/valuation', json=original_inputs, headers={'X-Profile': 'cpu', **token}).headers.get('X-Profile-Id'), \
+            "A failed profile should not keep later requests from being profiled"
+    finally:
+        profiling.PROFILING_TOKEN, profiling.PROFILE_DIR, profiling.PROFILE_BUFFER_SIZE = original
+
+    print(json.dumps(summaries, indent=2))
+    print("\n".join(sorted(stacks, key=lambda line: -int(line.rsplit(' ', 1)[1]))[:5]))
+
+    assert [summary['mode'] for summary in summaries[:2]] == ['memory', 'cpu'], "Profiles should be listed newest first"
+    assert summaries[0]['peak_bytes'] > 0
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in stacks + memory_stacks), "Lines should be collapsed stacks"
+    assert any('generate_columns (generate_columns.py' in line for line in stacks)
+    assert any('predict (predict.py' in line for line in stacks)
+    assert any('generate_columns.py' in line for line in memory_stacks)
+
+    print("All basic assertions for request profiling passed.")
+
+def test_chunked_aggregation():
+    print("\nTesting chunked comparables aggregation:")
+    import itertools
+    import math
+    import tracemalloc
+    import numpy as np
+    from aggregates import QuantileSketch
+    from benchmarks.synthetic import make_properties
+
+    # Streaming the comparables in pages gives the same columns as fetching them in full
+    original_inputs = {"beds": "3", "baths": "2", "size": "110", "latitude": "53.3498",
+                       "longitude": "-6.2603", "property_type": "House", "ber_rating": "B2"}
+    properties = make_properties(6000, 53.3498, -6.2603, spread_km=5.0)
+    with local_supabase(properties, 'fixed') as generate_columns_module:
+        fixed = generate_columns(original_inputs)
+        generate_columns_module.COMPARABLES_SEARCH = 'streaming'
+        streaming = generate_columns(original_inputs)
+    # Under PostgREST's max-rows cap both searches page through the whole box: pages shorter
+    # than the chunk size do not end the stream early, nor truncate the fixed fetch
+    with local_supabase(properties, 'fixed', max_rows=300) as generate_columns_module:
+        capped_fixed = generate_columns(original_inputs)
+        generate_columns_module.COMPARABLES_SEARCH = 'streaming'
+        capped = generate_columns(original_inputs)
+
+    for result in [streaming, capped, capped_fixed]:
+        assert list(result) == list(fixed), "Streaming should produce the same columns in the same order"
+        for key, value in fixed.items():
+            if isinstance(value, float) and math.isnan(value):
+                assert math.isnan(result[key]), key
+            elif isinstance(value, (int, float)):
+                assert math.isclose(result[key], value, rel_tol=1e-9), f"{key}: {result[key]} != {value}"
+            else:
+                assert result[key] == value, key
+
+    # Peak memory stays flat as the number of comparables grows
+    pages = [make_properties(2000, 53.3498, -6.2603, spread_km=5.0, seed=seed) for seed in range(5)]
+    peaks = {}
+    for rows in [10000, 100000]:
+        tracemalloc.start()
+        aggregates = generate_columns_module.aggregate_comparables(
+            itertools.islice(itertools.cycle(pages), rows // 2000), 53.3498, -6.2603, [1, 3, 5])
+        peaks[rows] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert aggregates[5].rows > 0.7 * rows
+    print(json.dumps({f"peak_bytes_{rows}_rows": peak for rows, peak in peaks.items()}))
+    assert peaks[100000] < 1.5 * peaks[10000], "Peak memory should not grow with the number of comparables"
+    assert peaks[100000] < 8 * 1024 * 1024
+
+    # Past max_distinct values the sketch switches to buckets: bounded size, medians within 0.5%
+    values = np.random.default_rng(0).lognormal(13, 0.4, 100000)
+    sketch = QuantileSketch()
+    for chunk in np.array_split(values, 100):
+        sketch.add(chunk)
+    assert not sketch.exact and len(sketch.values) < 2048
+    assert abs(sketch.median() - np.median(values)) <= 0.005 * np.median(values)
+    assert sketch.count == len(values) and math.isclose(sketch.mean, values.mean())
+
+    print("All basic assertions for chunked comparables aggregation passed.")
+
 if __name__ == "__main__":
     test_generate_columns()
     test_predict()
+    test_valuation()
+    test_serialization()
+    test_comparables()
+    test_categorical_encoders()
+    test_singleflight()
+    test_explain()
+    test_interval()
+    test_load_harness()
+    test_adaptive_radius()
+    test_profiling()
+    test_chunked_aggregation()
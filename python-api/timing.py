@@ -0,0 +1,54 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Stage durations (seconds) recorded for the request being handled, or None outside a request
+_stages = ContextVar('stages', default=None)
+
+def begin_request():
+    """
+    Start recording stage timings for the current request.
+    """
+    _stages.set({})
+
+def end_request():
+    """
+    Stop recording and return the stage timings of the current request.
+    """
+    stages = _stages.get()
+    _stages.set(None)
+    return stages or {}
+
+@contextmanager
+def stage(name):
+    """
+    Time a block as a named stage of the current request. A no-op outside a request.
+    """
+    stages = _stages.get()
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+def server_timing_header(stages):
+    """
+    Format stage timings as a Server-Timing header value (durations in milliseconds).
+    """
+    return ', '.join(f'{name};dur={seconds * 1e3:.2f}' for name, seconds in stages.items())
+
+def parse_server_timing(header):
+    """
+    Parse a Server-Timing header value back into {stage: milliseconds}.
+    """
+    stages = {}
+    for entry in filter(None, (part.strip() for part in (header or '').split(','))):
+        name, _, params = entry.partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur':
+                stages[name.strip()] = float(value)
+    return stages